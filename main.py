@@ -3,12 +3,22 @@ from typing import Optional
 from contextlib import asynccontextmanager
 
 from dotenv import load_dotenv
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, Header, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, field_validator
 from langchain_core.messages import HumanMessage, AIMessage
 
 from my_agent import mage_graph
+from my_agent.utils import traffic_capture
+from my_agent.utils.profiling import RequestProfile, create_loop_lag_monitor, should_profile
+from my_agent.utils.jobs import (
+    InMemoryJobStore,
+    JobPool,
+    JobQueueFullError,
+    validate_callback_endpoint,
+)
+from my_agent.utils.provider_selector import provider_selector
+from my_agent.utils.idempotency import RequestDeduplicator, derive_idempotency_key
 
 
 
@@ -38,6 +48,29 @@ class ChatResponse(BaseModel):
     response: str = Field(..., description="The agent's response message")
 
 
+class ChatJobRequest(ChatRequest):
+    """Request body for the /chat/jobs endpoint."""
+    priority: int = Field(default=0, description="Higher priority jobs run first")
+    callback_endpoint: Optional[str] = Field(
+        default=None,
+        description="Express endpoint to POST the result to when the job finishes"
+    )
+
+    @field_validator("callback_endpoint")
+    @classmethod
+    def check_callback_endpoint(cls, value: Optional[str]) -> Optional[str]:
+        return validate_callback_endpoint(value) if value is not None else None
+
+
+class ChatJobStatus(BaseModel):
+    """Response body for the /chat/jobs endpoints."""
+    job_id: str = Field(..., description="Job ID")
+    status: str = Field(..., description="queued, running, succeeded or failed")
+    priority: int = Field(..., description="Job priority")
+    result: Optional[str] = Field(default=None, description="The agent's response once succeeded")
+    error: Optional[str] = Field(default=None, description="Error message if the job failed")
+
+
 class HealthResponse(BaseModel):
     """Response body for the /health endpoint."""
     status: str = Field(..., description="Health status")
@@ -48,19 +81,46 @@ class HealthResponse(BaseModel):
 # Sliding window size for conversation history
 MAX_HISTORY_MESSAGES = 7
 
+# Background chat job settings
+CHAT_JOB_WORKERS = int(os.getenv("CHAT_JOB_WORKERS", 4))
+CHAT_JOB_QUEUE_SIZE = int(os.getenv("CHAT_JOB_QUEUE_SIZE", 100))
+
+# How long a finished /chat result is reused for duplicate requests
+IDEMPOTENCY_TTL_SECONDS = float(os.getenv("IDEMPOTENCY_TTL_SECONDS", 60))
+
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Application lifespan handler for startup/shutdown."""
     # Startup
     print("Summoning the mage...")
+    loop_lag_monitor = create_loop_lag_monitor()
+    if loop_lag_monitor:
+        loop_lag_monitor.start()
+    chat_job_pool.start()
     
     yield
     
     # Shutdown
+    await chat_job_pool.stop()
+    if loop_lag_monitor:
+        await loop_lag_monitor.stop()
     print("The Mage is leaving...")
 
 
+# Shares one graph run between duplicate /chat requests (retries, double sends)
+chat_deduplicator = RequestDeduplicator(ttl=IDEMPOTENCY_TTL_SECONDS)
+
+# Background job pool for /chat/jobs (swap the store for a shared one when running multiple instances)
+chat_job_store = InMemoryJobStore()
+chat_job_pool = JobPool(
+    runner=lambda chat_request: run_chat(chat_request),
+    store=chat_job_store,
+    workers=CHAT_JOB_WORKERS,
+    max_queue_size=CHAT_JOB_QUEUE_SIZE,
+)
+
+
 # Create FastAPI app
 app = FastAPI(
     title="NotesMage Agent",
@@ -113,61 +173,110 @@ async def health_check():
     )
 
 
-@app.post("/chat", response_model=ChatResponse)
-async def chat(request: ChatRequest):
+@app.get("/metrics/providers")
+async def provider_metrics():
     """
-    Main chat endpoint - processes user messages through The Mage agent.
+    Per-provider latency, error rate and tokens/sec, and the current provider order.
+    """
+    return provider_selector.snapshot()
+
+
+async def run_chat(request: ChatRequest, profile_header: Optional[str] = None) -> str:
+    """
+    Run a ChatRequest through The Mage agent and return the response text.
+    Shared by the /chat endpoint and the background job workers.
     
     Flow:
     1. Convert conversation history to LangChain messages
     2. Run through the LangGraph (guard_rails → agent ↔ tools)
-    3. Extract the final response and any actions taken
-    4. Return the response
+    3. Extract the final response text
     """
-    try:
-        # Convert history to LangChain messages
-        messages = convert_history_to_messages(request.conversation_history)
-        
-        # Prepare initial state
-        initial_state = {
-            "messages": messages,
-            "user_id": request.user_id,
-            "user_name": request.user_name
-        }
-        
-        # Run the graph
-        result = await mage_graph.ainvoke(initial_state)
-        
-        # Extract the final response
-        final_messages = result.get("messages", [])
-        if not final_messages:
-            raise HTTPException(
-                status_code=500,
-                detail="No response generated by the agent"
+    traffic_capture.start_capture(
+        request.user_id,
+        request.user_name,
+        [msg.model_dump() for msg in request.conversation_history or []],
+    )
+
+    # Convert history to LangChain messages
+    messages = convert_history_to_messages(request.conversation_history)
+    
+    # Prepare initial state
+    initial_state = {
+        "messages": messages,
+        "user_id": request.user_id,
+        "user_name": request.user_name,
+        "tool_memo": {},
+        "seen_notes": {},
+    }
+    
+    # Run the graph (profiled when requested via header or sampling)
+    if should_profile(profile_header):
+        async with RequestProfile() as profile:
+            result = await mage_graph.ainvoke(
+                initial_state, config={"callbacks": [profile.spans]}
             )
-        
+    else:
+        result = await mage_graph.ainvoke(initial_state)
     
-        last_message = final_messages[-1]
-        
-        # Handles both string content and list of content blocks (google vs groq vs deepseek responses!)
-        if isinstance(last_message.content, str):
-            response_content = last_message.content
-        elif isinstance(last_message.content, list):
-            # Extract text from content blocks
-            text_parts = []
-            for block in last_message.content:
-                if isinstance(block, dict) and block.get('type') == 'text':
-                    text_parts.append(block.get('text', ''))
-                elif isinstance(block, str):
-                    text_parts.append(block)
-            response_content = '\n'.join(text_parts).strip()
+    # Extract the final response
+    final_messages = result.get("messages", [])
+    if not final_messages:
+        raise HTTPException(
+            status_code=500,
+            detail="No response generated by the agent"
+        )
+    
+
+    last_message = final_messages[-1]
+    
+    # Handles both string content and list of content blocks (google vs groq vs deepseek responses!)
+    if isinstance(last_message.content, str):
+        response_content = last_message.content
+    elif isinstance(last_message.content, list):
+        # Extract text from content blocks
+        text_parts = []
+        for block in last_message.content:
+            if isinstance(block, dict) and block.get('type') == 'text':
+                text_parts.append(block.get('text', ''))
+            elif isinstance(block, str):
+                text_parts.append(block)
+        response_content = '\n'.join(text_parts).strip()
+    else:
+        response_content = ""
+    
+    if not response_content:
+        response_content = "I apologize, but I couldn't generate a response at the moment. Please try again later."
+    
+    traffic_capture.record_chat_response(response_content)
+    
+    return response_content
+
+
+@app.post("/chat", response_model=ChatResponse)
+async def chat(
+    request: ChatRequest,
+    x_mage_profile: Optional[str] = Header(default=None),
+    idempotency_key: Optional[str] = Header(default=None),
+):
+    """
+    Main chat endpoint - processes user messages through The Mage agent.
+    
+    Duplicate requests (same Idempotency-Key header, or same user and
+    conversation history when no header is sent) attach to the run already
+    in progress, or reuse its result for IDEMPOTENCY_TTL_SECONDS.
+    """
+    try:
+        if idempotency_key:
+            key = f"{request.user_id}:{idempotency_key}"
         else:
-            response_content = ""
-        
-        if not response_content:
-            response_content = "I apologize, but I couldn't generate a response at the moment. Please try again later."
-        
+            key = derive_idempotency_key(
+                request.user_id,
+                [msg.model_dump() for msg in request.conversation_history or []],
+            )
         
+        response_content = await chat_deduplicator.run(
+            key, lambda: run_chat(request, x_mage_profile)
+        )
         return ChatResponse(response=response_content)
     
     except HTTPException:
@@ -180,6 +289,37 @@ async def chat(request: ChatRequest):
         )
 
 
+@app.post("/chat/jobs", response_model=ChatJobStatus, status_code=202)
+async def submit_chat_job(request: ChatJobRequest):
+    """
+    Queue a chat request for background processing and return its job id.
+    Poll GET /chat/jobs/{job_id}, or pass callback_endpoint to have the
+    result POSTed back to Express when the job finishes.
+    """
+    chat_request = ChatRequest(**request.model_dump(include=set(ChatRequest.model_fields)))
+    try:
+        job = await chat_job_pool.submit(
+            chat_request,
+            priority=request.priority,
+            callback_endpoint=request.callback_endpoint,
+        )
+    except JobQueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    
+    return ChatJobStatus(**job)
+
+
+@app.get("/chat/jobs/{job_id}", response_model=ChatJobStatus)
+async def get_chat_job(job_id: str):
+    """
+    Get the status and, once finished, the response of a chat job.
+    """
+    job = await chat_job_store.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return ChatJobStatus(**job)
+
+
 # For local development
 if __name__ == "__main__":
     import uvicorn
@@ -2,18 +2,27 @@
 Agent node for The Mage - the main LLM-powered conversational node.
 """
 import asyncio
+import os
+import time
 from langchain_deepseek import ChatDeepSeek
 from langchain_groq import ChatGroq
 from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_core.messages import SystemMessage, AIMessage
+from langchain_core.messages import SystemMessage, AIMessage, message_to_dict
 from my_agent.state import MageState
 from my_agent.prompts import get_system_prompt
 from my_agent.tools import all_tools
+from my_agent.utils import traffic_capture
+from my_agent.utils.provider_selector import provider_selector
+from my_agent.utils.message_compaction import compact_tool_messages
+from my_agent.nodes.speculative_tools import stream_with_speculative_tools
 
 
 # Maximum number of providers to try before giving up
 MAX_PROVIDERS = 5
 
+# Stream LLM responses and start read-only tools before the message is complete
+SPECULATIVE_TOOL_EXECUTION = os.getenv("SPECULATIVE_TOOL_EXECUTION", "1") == "1"
+
 
 def get_llm(judge: int):
     """Get LLM based on judge counter - cycles through providers on rate limits."""
@@ -27,7 +36,8 @@ def get_llm(judge: int):
         case 4:
             llm = ChatGroq(model='llama-3.3-70b-versatile', temperature=0.7)
         case _:
-            llm = ChatDeepSeek(model='deepseek-chat', temperature=0.7)
+            # Streamed responses only carry token usage with stream_usage on
+            llm = ChatDeepSeek(model='deepseek-chat', temperature=0.7, stream_usage=True)
     return llm
 
 
@@ -65,15 +75,64 @@ def is_rate_limit_error(exception: Exception) -> bool:
     return False
 
 
+async def invoke_llm(messages, tools=None, state=None, record_stats=True) -> AIMessage | None:
+    """
+    Invoke the LLM, trying providers in the order chosen by provider_selector
+    and switching to the next one on rate limits.
+    
+    With tools and a state, the response is streamed and read-only tool calls
+    start speculatively (unless SPECULATIVE_TOOL_EXECUTION is off).
+    
+    Background calls with large, tool-less prompts (corpus map/reduce) pass
+    record_stats=False so they don't skew the latency stats that order
+    providers for interactive agent calls.
+    
+    Returns:
+        The LLM's response, or None if every provider was rate limited
+    """
+    for judge in provider_selector.ordered_providers(record=record_stats)[:MAX_PROVIDERS]:
+        started = time.perf_counter()
+        try:
+            llm = get_llm(judge)
+            if tools:
+                llm = llm.bind_tools(tools)
+            if tools and state is not None and SPECULATIVE_TOOL_EXECUTION:
+                response, elapsed = await stream_with_speculative_tools(llm, messages, state)
+            else:
+                response = await llm.ainvoke(messages)
+                elapsed = time.perf_counter() - started
+        except Exception as e:
+            if record_stats:
+                provider_selector.record_error(judge)
+            if is_rate_limit_error(e):
+                print(f"Rate limit hit on provider {judge}, switching to next provider...")
+                # Small delay before retrying with next provider
+                await asyncio.sleep(0.5)
+                continue
+            # For non-rate-limit errors, re-raise
+            raise
+
+        if record_stats:
+            usage = getattr(response, "usage_metadata", None) or {}
+            provider_selector.record_success(judge, elapsed, usage.get("output_tokens"))
+        if traffic_capture.is_enabled():
+            traffic_capture.record_llm(judge, message_to_dict(response), elapsed)
+        return response
+
+    return None
+
+
 async def agent_node(state: MageState) -> MageState:
     """
     Main agent node - processes user messages through the LLM with tools.
     
     This node:
-    1. Prepends the system prompt
+    1. Prepends the system prompt and compacts tool outputs the LLM already read
     2. Invokes the LLM with the conversation history
-    3. Returns the LLM's response (may include tool calls)
-    4. Gracefully handles rate limits by switching to alternate providers
+    3. Returns the LLM's response (may include tool calls), running read-only
+       tool calls speculatively while the response streams
+    4. Gracefully handles rate limits by switching to alternate providers,
+       tried in the order chosen by provider_selector (fastest first within a tier)
     
     Note: user_id is accessed by tools via ToolRuntime.state, not passed through prompt.
     
@@ -88,26 +147,9 @@ async def agent_node(state: MageState) -> MageState:
     user_name = state['user_name']
     
     system_message = SystemMessage(content=get_system_prompt(user_name))
-    messages = [system_message] + list(state["messages"])
+    messages = [system_message] + compact_tool_messages(state["messages"])
     
-    judge = 1
-    response = None
-
-    while judge <= MAX_PROVIDERS:
-        try:
-            llm = get_llm(judge).bind_tools(all_tools)
-            response = await llm.ainvoke(messages)
-            # Success - break out of the retry loop
-            break
-        except Exception as e:
-            if is_rate_limit_error(e):
-                print(f"Rate limit hit on provider {judge}, switching to next provider...")
-                judge += 1
-                # Small delay before retrying with next provider
-                await asyncio.sleep(0.5)
-            else:
-                # For non-rate-limit errors, re-raise
-                raise
+    response = await invoke_llm(messages, tools=all_tools, state=state)
     
     # If all providers failed due to rate limits, gracefully returns a friendly message
     if response is None:
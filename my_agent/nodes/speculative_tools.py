@@ -0,0 +1,101 @@
+"""
+Speculative execution of read-only tools while the LLM is still streaming.
+
+As soon as a read tool call's arguments are fully streamed, the tool is
+started in the background. Read tools store their results in the run memo
+(see my_agent/utils/tool_memo.py), so when ToolNode later executes the
+final message's tool calls it gets those results without another Express
+round trip. Write tools are never run speculatively.
+"""
+
+import asyncio
+import json
+import time
+from typing import Any
+
+from langchain_core.messages import AIMessage, message_chunk_to_message
+
+from my_agent.tools import (
+    get_user_context,
+    get_user_notes,
+    search_user_notes,
+    get_user_categories,
+)
+
+
+# Tools that are safe to run before the LLM has finished its message
+READ_ONLY_TOOLS = {
+    t.name: t for t in [
+        get_user_context,
+        get_user_notes,
+        search_user_notes,
+        get_user_categories,
+    ]
+}
+
+
+class _StateRuntime:
+    """Minimal ToolRuntime stand-in; read tools only use runtime.state."""
+
+    def __init__(self, state):
+        self.state = state
+
+
+def _parse_complete_args(args: str | None) -> dict | None:
+    """
+    Return the call's arguments once they are fully streamed, else None.
+    A partial JSON object never parses, so a successful parse means complete.
+    """
+    if not args:
+        return None
+    try:
+        parsed = json.loads(args)
+    except json.JSONDecodeError:
+        return None
+    return parsed if isinstance(parsed, dict) else None
+
+
+async def _run_read_tool(name: str, args: dict[str, Any], state) -> None:
+    try:
+        await READ_ONLY_TOOLS[name].coroutine(**args, runtime=_StateRuntime(state))
+    except Exception as e:
+        # ToolNode will run the call again and surface any real error
+        print(f"Speculative {name} call failed: {e}")
+
+
+async def stream_with_speculative_tools(llm, messages, state) -> tuple[AIMessage, float]:
+    """
+    Stream the LLM response, starting read tools as soon as their calls are
+    complete, and return the final message once any started tools finish.
+
+    Returns:
+        The final message and the seconds the LLM stream took, not counting
+        the wait for speculative tools, so provider stats measure only the LLM
+    """
+    aggregate = None
+    dispatched: set[str] = set()
+    tasks: list[asyncio.Task] = []
+    started = time.perf_counter()
+    stream_elapsed = None
+
+    try:
+        async for chunk in llm.astream(messages):
+            aggregate = chunk if aggregate is None else aggregate + chunk
+
+            for call in aggregate.tool_call_chunks:
+                call_id = call.get("id")
+                if call.get("name") not in READ_ONLY_TOOLS or not call_id or call_id in dispatched:
+                    continue
+                args = _parse_complete_args(call.get("args"))
+                if args is None:
+                    continue
+                dispatched.add(call_id)
+                tasks.append(asyncio.create_task(_run_read_tool(call["name"], args, state)))
+        stream_elapsed = time.perf_counter() - started
+    finally:
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    if aggregate is None:
+        return AIMessage(content=""), stream_elapsed
+    return message_chunk_to_message(aggregate), stream_elapsed
@@ -18,3 +18,10 @@ class MageState(TypedDict):
     user_id: str
     user_name: str
 
+    # Run-scoped read tool results, keyed by tool name + normalized args.
+    # Mutated in place by tools (see my_agent/utils/tool_memo.py).
+    tool_memo: dict
+
+    # Latest version of every note read during this run, keyed by note ID.
+    # Used by edit_note as the base for patch-style edits.
+    seen_notes: dict
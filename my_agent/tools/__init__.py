@@ -9,6 +9,7 @@ from my_agent.tools.notes import (
     create_note,
     create_multiple_notes,
     update_note,
+    edit_note,
     delete_note,
 )
 from my_agent.tools.categories import (
@@ -18,6 +19,8 @@ from my_agent.tools.categories import (
     delete_category,
     assign_notes_to_category,
 )
+from my_agent.tools.plan import execute_plan
+from my_agent.tools.corpus import process_all_notes
 
 # All tools available to the agent
 all_tools = [
@@ -27,11 +30,14 @@ all_tools = [
     create_note,
     create_multiple_notes,
     update_note,
+    edit_note,
     delete_note,
     get_user_categories,
     create_category,
     update_category,
     delete_category,
     assign_notes_to_category,
+    execute_plan,
+    process_all_notes,
 ]
 
@@ -8,6 +8,8 @@ so the LLM doesn't need to pass it as a parameter.
 
 from langchain.tools import tool, ToolRuntime
 from my_agent.utils.express_client import express_client
+from my_agent.utils.tool_memo import memoized_read, invalidate_run_memo
+from my_agent.utils import category_index
 
 from datetime import date
 
@@ -21,7 +23,12 @@ async def get_user_categories(runtime: ToolRuntime) -> dict:
     """
     try:
         user_id = runtime.state["user_id"]
-        result = await express_client.get(f"/api/agent/categories/{user_id}")
+        result = await memoized_read(
+            runtime, "get_user_categories", {},
+            lambda: express_client.get(f"/api/agent/categories/{user_id}"),
+        )
+        if "error" not in result:
+            category_index.update_index(user_id, result)
         return result
     except Exception as e:
         return {"error": str(e), "success": False}
@@ -48,7 +55,11 @@ async def create_category(
             "name": name,
         }
         
-        result = await express_client.post("/api/agent/categories/create", data)
+        try:
+            result = await express_client.post("/api/agent/categories/create", data)
+        finally:
+            invalidate_run_memo(runtime)
+            category_index.invalidate(user_id)
         return result
     except Exception as e:
         return {"error": str(e), "success": False}
@@ -58,39 +69,58 @@ async def create_category(
 async def update_category(
     category_id: str,
     name: str,
+    runtime: ToolRuntime = None,
 ) -> dict:
     """
     Update an existing category (rename it).
     
     Args:
-        category_id: The MongoDB category ID to update
+        category_id: The category ID or exact current category name to update
         name: New name for the category
     
     Returns:
-        Dictionary containing the updated category details
+        Dictionary containing the updated category details and the name it had before
     """
     try:
+        user_id = runtime.state["user_id"]
+        category_id = await category_index.resolve_category_id(user_id, category_id, exact=True)
+        previous_name = category_index.category_name(user_id, category_id)
         data = {"name": name}
         
-        result = await express_client.put(f"/api/agent/categories/{category_id}", data)
+        try:
+            result = await express_client.put(f"/api/agent/categories/{category_id}", data)
+        finally:
+            invalidate_run_memo(runtime)
+            category_index.invalidate(user_id)
+        if isinstance(result, dict) and previous_name:
+            result = {**result, "renamed_from": previous_name}
         return result
     except Exception as e:
         return {"error": str(e), "success": False}
 
 
 @tool
-async def delete_category(category_id: str) -> dict:
+async def delete_category(category_id: str, runtime: ToolRuntime = None) -> dict:
     """
     Delete a category. Notes in this category will become uncategorized.
     
     Args:
-        category_id: The MongoDB category ID to delete
+        category_id: The category ID or exact category name to delete
     
     Returns:
-        Dictionary confirming deletion
+        Dictionary confirming deletion, with the name of the deleted category
     """
     try:
-        result = await express_client.delete(f"/api/agent/categories/{category_id}")
+        user_id = runtime.state["user_id"]
+        category_id = await category_index.resolve_category_id(user_id, category_id, exact=True)
+        deleted_name = category_index.category_name(user_id, category_id)
+        try:
+            result = await express_client.delete(f"/api/agent/categories/{category_id}")
+        finally:
+            invalidate_run_memo(runtime)
+            category_index.invalidate(user_id)
+        if isinstance(result, dict) and deleted_name:
+            result = {**result, "category": deleted_name}
         return result
     except Exception as e:
         return {"error": str(e), "success": False}
@@ -100,23 +130,32 @@ async def delete_category(category_id: str) -> dict:
 async def assign_notes_to_category(
     category_id: str,
     note_ids: list[str],
+    runtime: ToolRuntime = None,
 ) -> dict:
     """
     Assign multiple notes to a category.
     
     Args:
-        category_id: The MongoDB category ID to assign notes to, "null" to uncategorize
+        category_id: The category ID or category name to assign notes to, "null" to uncategorize
         note_ids: List of note IDs to assign to the category
     
     Returns:
-        Dictionary confirming the assignment
+        Dictionary confirming the assignment, with the name of the matched category
     """
     try:
+        user_id = runtime.state["user_id"]
+        category_id = await category_index.resolve_category_id(user_id, category_id)
         data = {"noteIds": note_ids}
-        result = await express_client.put(
-            f"/api/agent/categories/{category_id}/assign",
-            data
-        )
+        try:
+            result = await express_client.put(
+                f"/api/agent/categories/{category_id}/assign",
+                data
+            )
+        finally:
+            invalidate_run_memo(runtime)
+        matched_name = category_index.category_name(user_id, category_id)
+        if isinstance(result, dict) and matched_name:
+            result = {**result, "category": matched_name}
         return result
     except Exception as e:
         return {"error": str(e), "success": False}
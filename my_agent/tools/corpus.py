@@ -0,0 +1,159 @@
+"""
+Corpus-wide note processing for The Mage agent.
+process_all_notes pages through every note the user has and runs a
+map-reduce over them with separate LLM calls, so requests like
+"summarize all my notes" aren't limited by get_user_notes' page size or
+by the agent's context window.
+"""
+
+import asyncio
+import json
+
+from langchain.tools import tool, ToolRuntime
+from langchain_core.messages import SystemMessage, HumanMessage
+from my_agent.tools.notes import fetch_user_notes
+
+
+# Map-reduce limits
+MAX_CORPUS_NOTES = 2000
+CHUNK_MAX_CHARS = 12000
+NOTE_MAX_CHARS = 4000
+MAP_CONCURRENCY = 4
+REDUCE_BATCH_SIZE = 8
+
+NO_RESULT = "NONE"
+
+MAP_PROMPT = (
+    "You are helping answer a request about a user's notes. You are given one batch "
+    "of their notes. Extract everything in this batch that is relevant to the request, "
+    "citing note titles and IDs. Be concise. If nothing is relevant, reply exactly "
+    f"{NO_RESULT}."
+)
+
+REDUCE_PROMPT = (
+    "You are combining partial results, each produced from a different batch of the "
+    "same user's notes, into one answer to the request. Merge duplicates, keep note "
+    "titles and IDs, and don't mention batches."
+)
+
+
+def _message_text(message) -> str:
+    """Text of an LLM response, handling both string and content-block formats."""
+    if message is None:
+        return ""
+    if isinstance(message.content, str):
+        return message.content.strip()
+    parts = []
+    for block in message.content:
+        if isinstance(block, dict) and block.get("type") == "text":
+            parts.append(block.get("text", ""))
+        elif isinstance(block, str):
+            parts.append(block)
+    return "\n".join(parts).strip()
+
+
+def _format_note(note: dict) -> str:
+    content = str(note.get("content") or "")
+    if len(content) > NOTE_MAX_CHARS:
+        content = content[:NOTE_MAX_CHARS] + " [...]"
+    return json.dumps({
+        "id": note.get("_id"),
+        "title": note.get("title"),
+        "category": note.get("categoryId"),
+        "content": content,
+    }, ensure_ascii=False, default=str)
+
+
+def _chunk_formatted(notes: list[str]) -> list[str]:
+    """Group formatted notes into chunks of at most CHUNK_MAX_CHARS."""
+    chunks, current, size = [], [], 0
+    for note in notes:
+        if current and size + len(note) > CHUNK_MAX_CHARS:
+            chunks.append("\n".join(current))
+            current, size = [], 0
+        current.append(note)
+        size += len(note)
+    if current:
+        chunks.append("\n".join(current))
+    return chunks
+
+
+async def _ask(system_prompt: str, request: str, body: str, semaphore: asyncio.Semaphore) -> str:
+    # Imported here because my_agent.nodes.agent imports the tools package
+    from my_agent.nodes.agent import invoke_llm
+
+    async with semaphore:
+        response = await invoke_llm([
+            SystemMessage(content=system_prompt),
+            HumanMessage(content=f"Request: {request}\n\n{body}"),
+        ], record_stats=False)
+    if response is None:
+        raise RuntimeError("All LLM providers are rate limited")
+    return _message_text(response)
+
+
+async def _reduce(instruction: str, partials: list[str], semaphore: asyncio.Semaphore) -> str:
+    """Merge partial results in batches until a single result remains."""
+    while len(partials) > 1:
+        batches = [
+            partials[i:i + REDUCE_BATCH_SIZE]
+            for i in range(0, len(partials), REDUCE_BATCH_SIZE)
+        ]
+        partials = await asyncio.gather(*[
+            _ask(
+                REDUCE_PROMPT,
+                instruction,
+                "\n\n".join(f"Partial result {n + 1}:\n{text}" for n, text in enumerate(batch)),
+                semaphore,
+            )
+            for batch in batches
+        ])
+    return partials[0]
+
+
+@tool
+async def process_all_notes(instruction: str, runtime: ToolRuntime = None) -> dict:
+    """
+    Answer a request that needs ALL of the user's notes, e.g. "summarize all my
+    notes" or "find every note about taxes". Reads every note in batches,
+    so it is slower than get_user_notes; use it only for corpus-wide requests.
+
+    Args:
+        instruction: What to do with the notes, in plain language
+
+    Returns:
+        Dictionary with the combined result and how many notes were processed
+    """
+    try:
+        user_id = runtime.state["user_id"]
+        semaphore = asyncio.Semaphore(MAP_CONCURRENCY)
+
+        notes, truncated = await fetch_user_notes(user_id, max_notes=MAX_CORPUS_NOTES)
+        formatted = [_format_note(note) for note in notes]
+
+        if not formatted:
+            return {"success": True, "notes_processed": 0, "result": "The user has no notes."}
+
+        chunks = _chunk_formatted(formatted)
+        mapped = await asyncio.gather(*[
+            _ask(MAP_PROMPT, instruction, f"Notes:\n{chunk}", semaphore)
+            for chunk in chunks
+        ])
+        partials = [text for text in mapped if text and text.strip() != NO_RESULT]
+
+        if not partials:
+            result = "None of the user's notes are relevant to this request."
+        elif len(partials) == 1:
+            result = partials[0]
+        else:
+            result = await _reduce(instruction, partials, semaphore)
+
+        return {
+            "success": True,
+            "notes_processed": len(formatted),
+            "batches": len(chunks),
+            "truncated": truncated,
+            "result": result,
+        }
+    except Exception as e:
+        return {"error": str(e), "success": False}
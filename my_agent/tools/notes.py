@@ -6,9 +6,30 @@ Tools use ToolRuntime to access user_id from graph state,
 so the LLM doesn't need to pass it as a parameter.
 """
 
+import asyncio
+import json
 from typing import Optional
+
+import httpx
 from langchain.tools import tool, ToolRuntime
 from my_agent.utils.express_client import express_client
+from my_agent.utils.tool_memo import (
+    memoized_read,
+    invalidate_run_memo,
+    remember_notes,
+    get_seen_note,
+)
+from my_agent.utils.category_index import category_name, resolve_category_id
+
+
+# Limits for splitting create_multiple_notes into batch-create requests
+BATCH_CHUNK_MAX_NOTES = 25
+BATCH_CHUNK_MAX_BYTES = 256 * 1024
+BATCH_MAX_CONCURRENCY = 4
+BATCH_CHUNK_RETRIES = 2
+
+# Largest single notes read when Express doesn't return a nextCursor
+UNPAGED_MAX_NOTES = 500
 
 
 @tool
@@ -22,27 +43,41 @@ async def get_user_context(runtime: ToolRuntime) -> dict:
     """
     try:
         user_id = runtime.state["user_id"]
-        result = await express_client.get(f"/api/agent/context/{user_id}")
+        result = await memoized_read(
+            runtime, "get_user_context", {},
+            lambda: express_client.get(f"/api/agent/context/{user_id}"),
+        )
         return result
     except Exception as e:
         return {"error": str(e), "success": False}
 
 
 @tool
-async def get_user_notes(limit: int = 10, runtime: ToolRuntime = None) -> dict:
+async def get_user_notes(
+    limit: int = 10,
+    cursor: Optional[str] = None,
+    runtime: ToolRuntime = None,
+) -> dict:
     """
-    Fetch all notes for a user.
+    Fetch all notes for a user, one page at a time.
+    For questions about all of the user's notes, use process_all_notes instead.
     
     Args:
         limit: Maximum number of notes to fetch (default 10)
+        cursor: nextCursor from a previous call, to fetch the following page
     
     Returns:
-        Dictionary containing the user's notes
+        Dictionary containing the user's notes and nextCursor if more remain
     """
     try:
         user_id = runtime.state["user_id"]
         params = {"limit": limit}
-        result = await express_client.get(f"/api/agent/notes/{user_id}", params=params)
+        if cursor:
+            params["cursor"] = cursor
+        result = await memoized_read(
+            runtime, "get_user_notes", params,
+            lambda: express_client.get(f"/api/agent/notes/{user_id}", params=params),
+        )
         return result
     except Exception as e:
         return {"error": str(e), "success": False}
@@ -63,7 +98,10 @@ async def search_user_notes(query: str, limit: int = 10, runtime: ToolRuntime =
     try:
         user_id = runtime.state["user_id"]
         params = {"q": query, "limit": limit}
-        result = await express_client.get(f"/api/agent/notes/{user_id}/search", params=params)
+        result = await memoized_read(
+            runtime, "search_user_notes", params,
+            lambda: express_client.get(f"/api/agent/notes/{user_id}/search", params=params),
+        )
         return result
     except Exception as e:
         return {"error": str(e), "success": False}
@@ -82,10 +120,10 @@ async def create_note(
     Args:
         title: The title of the note
         content: The content/body of the note
-        category_id: Optional category ID to assign the note to
+        category_id: Optional category ID or category name to assign the note to
     
     Returns:
-        Dictionary containing the created note details
+        Dictionary containing the created note details, with the name of the matched category
     """
     try:
         user_id = runtime.state["user_id"]
@@ -95,10 +133,14 @@ async def create_note(
             "content": content,
         }
         if category_id:
-            data["categoryId"] = category_id
+            data["categoryId"] = await resolve_category_id(user_id, category_id)
         
-        result = await express_client.post("/api/agent/notes/create", data)
-        return result
+        try:
+            result = await express_client.post("/api/agent/notes/create", data)
+        finally:
+            invalidate_run_memo(runtime)
+        remember_notes(runtime, result)
+        return _with_category_name(result, user_id, data.get("categoryId"))
     except Exception as e:
         return {"error": str(e), "success": False}
 
@@ -110,31 +152,217 @@ async def create_multiple_notes(
 ) -> dict:
     """
     Create multiple notes at once for the user.
+    Large lists are sent in smaller batches, so some notes may fail while others succeed.
     
     Args:
-        notes: List of note objects, each with 'title', 'content', and optional 'categoryId'
+        notes: List of note objects, each with 'title', 'content', and optional 'categoryId' (category ID or name)
     
     Returns:
-        Dictionary containing the created notes details
+        Dictionary with created/failed counts and a result entry for every note,
+        including the name of the category each note was matched to
     """
     try:
         user_id = runtime.state["user_id"]
-        data = {
-            "userId": user_id,
-            "notes": notes,
+        notes = await _resolve_note_categories(user_id, notes)
+        chunks = _chunk_notes(notes)
+        semaphore = asyncio.Semaphore(BATCH_MAX_CONCURRENCY)
+
+        try:
+            chunk_results = await asyncio.gather(*[
+                _send_notes_chunk(user_id, chunk, semaphore) for chunk in chunks
+            ])
+        finally:
+            invalidate_run_memo(runtime)
+
+        results = [
+            _with_category_name(note_result, user_id, notes[note_result["index"]].get("categoryId"))
+            for chunk_result in chunk_results
+            for note_result in chunk_result
+        ]
+        created = sum(1 for r in results if r["success"])
+        return {
+            "success": created == len(results),
+            "created_count": created,
+            "failed_count": len(results) - created,
+            "results": results,
         }
-        result = await express_client.post("/api/agent/notes/batch-create", data)
-        return result
     except Exception as e:
         return {"error": str(e), "success": False}
 
 
+async def _get_notes_page(user_id: str, params: dict) -> tuple[list, Optional[str]]:
+    """Fetch one page of notes and return it with Express's nextCursor, if any."""
+    result = await express_client.get(f"/api/agent/notes/{user_id}", params=params)
+    if isinstance(result, dict):
+        return result.get("notes", []), result.get("nextCursor")
+    return result, None
+
+
+async def fetch_user_notes(
+    user_id: str,
+    page_size: int = 100,
+    max_notes: int = 2000,
+) -> tuple[list[dict], bool]:
+    """
+    Fetch up to max_notes of a user's notes, following Express's nextCursor.
+    Stops if a page repeats. If the first page is full but has no cursor
+    (cursor not supported), the notes are fetched again in one request of
+    at most UNPAGED_MAX_NOTES, since larger reads risk the client timeout.
+
+    Returns:
+        The notes, and whether the user has more notes than were returned
+    """
+    # One note past the limit tells whether there are more
+    limit = max_notes + 1
+    cursor = None
+    seen_ids: set[str] = set()
+    fetched: list[dict] = []
+
+    while len(fetched) < limit:
+        params = {"limit": min(page_size, limit - len(fetched))}
+        if cursor:
+            params["cursor"] = cursor
+        notes, next_cursor = await _get_notes_page(user_id, params)
+
+        first_page_full = cursor is None and len(notes) >= params["limit"]
+        if first_page_full and not next_cursor and params["limit"] < limit:
+            unpaged_limit = min(limit, UNPAGED_MAX_NOTES + 1)
+            notes, _ = await _get_notes_page(user_id, {"limit": unpaged_limit})
+            notes = [n for n in notes if isinstance(n, dict)]
+            return notes[:unpaged_limit - 1], len(notes) >= unpaged_limit
+
+        page = [n for n in notes if isinstance(n, dict) and str(n.get("_id")) not in seen_ids]
+        if not page:
+            break
+        seen_ids.update(str(n.get("_id")) for n in page)
+        fetched.extend(page)
+
+        cursor = next_cursor
+        if not cursor:
+            break
+
+    return fetched[:max_notes], len(fetched) > max_notes
+
+
+def _with_category_name(result: dict, user_id: str, category_id: Optional[str]) -> dict:
+    """Add the name of the category a note was filed under, so fuzzy matches are visible."""
+    name = category_name(user_id, category_id) if category_id else None
+    if isinstance(result, dict) and name:
+        return {**result, "category": name}
+    return result
+
+
+async def _resolve_note_categories(user_id: str, notes: list[dict]) -> list[dict]:
+    """Replace category names in each note's 'categoryId' with category IDs."""
+    categories = list({note["categoryId"] for note in notes if note.get("categoryId")})
+    resolved_ids = await asyncio.gather(*[
+        resolve_category_id(user_id, category) for category in categories
+    ])
+    resolved = dict(zip(categories, resolved_ids))
+    return [
+        {**note, "categoryId": resolved[note["categoryId"]]} if note.get("categoryId") else note
+        for note in notes
+    ]
+
+
+def _chunk_notes(notes: list[dict]) -> list[list[tuple[int, dict]]]:
+    """
+    Split notes into chunks bounded by note count and serialized size.
+    Each note keeps its original index so results can be reported per note.
+    """
+    chunks = []
+    current = []
+    current_bytes = 0
+
+    for index, note in enumerate(notes):
+        note_bytes = len(json.dumps(note, default=str).encode("utf-8"))
+        if current and (
+            len(current) >= BATCH_CHUNK_MAX_NOTES
+            or current_bytes + note_bytes > BATCH_CHUNK_MAX_BYTES
+        ):
+            chunks.append(current)
+            current = []
+            current_bytes = 0
+        current.append((index, note))
+        current_bytes += note_bytes
+
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def _is_safe_to_retry(error: Exception) -> bool:
+    """
+    True only for failures where Express can't have created any notes:
+    the connection was never established, or Express answered 503.
+    """
+    if isinstance(error, (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)):
+        return True
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code == 503
+    return False
+
+
+async def _send_notes_chunk(
+    user_id: str,
+    chunk: list[tuple[int, dict]],
+    semaphore: asyncio.Semaphore,
+) -> list[dict]:
+    """
+    Send one chunk to batch-create, retrying it only when the request
+    can't have been applied. Returns one result entry per note in the chunk.
+    """
+    data = {
+        "userId": user_id,
+        "notes": [note for _, note in chunk],
+    }
+    error = None
+
+    for attempt in range(BATCH_CHUNK_RETRIES + 1):
+        try:
+            async with semaphore:
+                result = await express_client.post("/api/agent/notes/batch-create", data)
+        except httpx.ReadTimeout as e:
+            # Express may still have created these notes; retrying could duplicate them
+            error = f"Timed out waiting for Express, notes may or may not have been created: {e}"
+            break
+        except Exception as e:
+            error = str(e)
+            if _is_safe_to_retry(e) and attempt < BATCH_CHUNK_RETRIES:
+                await asyncio.sleep(0.5 * (attempt + 1))
+                continue
+            break
+
+        if not isinstance(result, dict) or result.get("success") is False:
+            error = (
+                (result.get("message") or result.get("error")) if isinstance(result, dict) else None
+            ) or "Express did not create these notes"
+            break
+
+        created_notes = result.get("notes")
+        if not isinstance(created_notes, list) or len(created_notes) != len(chunk):
+            created_notes = [None] * len(chunk)
+        entries = []
+        for (index, note), created in zip(chunk, created_notes):
+            entry = {"index": index, "title": note.get("title"), "success": True}
+            if created is not None:
+                entry["note"] = created
+            entries.append(entry)
+        return entries
+
+    return [
+        {"index": index, "title": note.get("title"), "success": False, "error": error}
+        for index, note in chunk
+    ]
+
+
 @tool
 async def update_note(
     note_id: str,
     title: Optional[str] = None,
     content: Optional[str] = None,
-    category_id: Optional[str] = None
+    category_id: Optional[str] = None,
+    runtime: ToolRuntime = None,
 ) -> dict:
     """
     Update an existing note.
@@ -144,30 +372,175 @@ async def update_note(
         note_id: The MongoDB note ID to update
         title: New title (optional, keeps existing if not provided)
         content: New content (optional, keeps existing if not provided)
-        category_id: Category ID to assign (optional)
+        category_id: Category ID or category name to assign (optional)
     
     Returns:
-        Dictionary containing the updated note details
+        Dictionary containing the updated note details, with the name of the matched category
     """
     
     try:
+        user_id = runtime.state["user_id"]
         data = {}
         if title is not None:
             data["title"] = title
         if content is not None:
             data["content"] = content
         if category_id is not None:
-            data["categoryId"] = category_id
+            data["categoryId"] = await resolve_category_id(user_id, category_id)
         
-        result = await express_client.put(f"/api/agent/notes/{note_id}", data)
+        try:
+            result = await express_client.put(f"/api/agent/notes/{note_id}", data)
+        finally:
+            invalidate_run_memo(runtime)
+        remember_notes(runtime, result)
+        return _with_category_name(result, user_id, data.get("categoryId"))
+    except Exception as e:
+        return {"error": str(e), "success": False}
+
+
+@tool
+async def edit_note(
+    note_id: str,
+    edits: list[dict],
+    runtime: ToolRuntime = None,
+) -> dict:
+    """
+    Apply small edits to a note's content without rewriting the whole note.
+    Prefer this over update_note when changing part of a longer note.
+    The note must have been read earlier in this conversation turn
+    (get_user_notes or search_user_notes).
+    
+    Args:
+        note_id: The MongoDB note ID to edit
+        edits: Edits applied in order, each one of:
+            - {"op": "replace", "find": "old text", "replace": "new text"} (every occurrence)
+            - {"op": "append", "text": "..."} (adds to the end)
+            - {"op": "prepend", "text": "..."} (adds to the start)
+            - {"op": "insert_after_heading", "heading": "Groceries", "text": "..."}
+              (adds to the end of that heading's section)
+            - {"op": "replace_lines", "start": 3, "end": 5, "text": "..."}
+              (1-based, inclusive; use "" to delete the lines)
+    
+    Returns:
+        Dictionary containing the updated note details
+    """
+    try:
+        user_id = runtime.state["user_id"]
+        note = get_seen_note(runtime, note_id)
+        if note is None:
+            return {
+                "error": "Note content is not known yet. Read the note with get_user_notes "
+                         "or search_user_notes first, or use update_note.",
+                "success": False,
+            }
+
+        current = await _fetch_current_note(user_id, note)
+        if current is not None and _note_version(current) != _note_version(note):
+            remember_notes(runtime, current)
+            return {
+                "error": "The note changed since it was read. Review its current content and try again.",
+                "success": False,
+                "note": current,
+            }
+
+        content = _apply_edits(note.get("content") or "", edits)
+        try:
+            result = await express_client.put(f"/api/agent/notes/{note_id}", {"content": content})
+        finally:
+            invalidate_run_memo(runtime)
+        remember_notes(runtime, result)
         return result
     except Exception as e:
         return {"error": str(e), "success": False}
 
 
+async def _fetch_current_note(user_id: str, note: dict) -> Optional[dict]:
+    """
+    Look the note up again through the search endpoint (by title) to detect
+    concurrent changes. Returns None if search doesn't return it.
+    """
+    title = note.get("title")
+    if not title:
+        return None
+    result = await express_client.get(
+        f"/api/agent/notes/{user_id}/search", params={"q": title, "limit": 20}
+    )
+    for candidate in _find_notes_in(result):
+        if str(candidate.get("_id")) == str(note["_id"]):
+            return candidate
+    return None
+
+
+def _find_notes_in(result) -> list[dict]:
+    notes = result.get("notes") if isinstance(result, dict) else result
+    return [n for n in notes if isinstance(n, dict)] if isinstance(notes, list) else []
+
+
+def _note_version(note: dict):
+    """The updatedAt timestamp when Express provides it, else the content itself."""
+    return note.get("updatedAt") or note.get("content")
+
+
+def _heading_level(line: str) -> int:
+    stripped = line.lstrip()
+    level = len(stripped) - len(stripped.lstrip("#"))
+    return level if level and stripped[level:level + 1] in (" ", "") else 0
+
+
+def _apply_edits(content: str, edits: list[dict]) -> str:
+    """Apply edit operations in order. Raises ValueError if an edit can't be applied."""
+    for edit in edits:
+        op = edit.get("op")
+        if op == "replace":
+            find = edit.get("find") or ""
+            if not find or find not in content:
+                raise ValueError(f"Text to replace was not found: {find!r}")
+            content = content.replace(find, edit.get("replace", ""))
+
+        elif op == "append":
+            separator = "" if not content or content.endswith("\n") else "\n"
+            content = content + separator + edit.get("text", "")
+
+        elif op == "prepend":
+            text = edit.get("text", "")
+            content = text + ("" if text.endswith("\n") else "\n") + content
+
+        elif op == "insert_after_heading":
+            heading = (edit.get("heading") or "").strip().lstrip("#").strip().casefold()
+            lines = content.split("\n")
+            for index, line in enumerate(lines):
+                level = _heading_level(line)
+                if level and line.strip().lstrip("#").strip().casefold() == heading:
+                    # Section ends at the next heading of the same or higher level
+                    end = index + 1
+                    while end < len(lines) and not (0 < _heading_level(lines[end]) <= level):
+                        end += 1
+                    while end > index + 1 and not lines[end - 1].strip():
+                        end -= 1
+                    lines[end:end] = edit.get("text", "").split("\n")
+                    break
+            else:
+                raise ValueError(f"Heading not found: {edit.get('heading')!r}")
+            content = "\n".join(lines)
+
+        elif op == "replace_lines":
+            lines = content.split("\n")
+            start, end = int(edit.get("start", 0)), int(edit.get("end", edit.get("start", 0)))
+            if not 1 <= start <= end <= len(lines):
+                raise ValueError(f"Line range {start}-{end} is outside the note (1-{len(lines)})")
+            text = edit.get("text", "")
+            lines[start - 1:end] = text.split("\n") if text else []
+            content = "\n".join(lines)
+
+        else:
+            raise ValueError(f"Unknown edit op: {op!r}")
+    return content
+
+
 @tool
 async def delete_note(
-    note_id: str
+    note_id: str,
+    runtime: ToolRuntime = None,
 ) -> dict:
     """
     Delete a note. 
@@ -181,9 +554,12 @@ async def delete_note(
     """
     
     try:
-        result = await express_client.delete(
-            f"/api/agent/notes/{note_id}"
-        )
+        try:
+            result = await express_client.delete(
+                f"/api/agent/notes/{note_id}"
+            )
+        finally:
+            invalidate_run_memo(runtime)
         return result
     except Exception as e:
         return {"error": str(e), "success": False}
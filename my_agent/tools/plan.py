@@ -0,0 +1,250 @@
+"""
+Plan executor tool for The Mage agent.
+Runs an ordered plan of note/category operations in a single tool call,
+so multi-step requests don't need an agent ↔ tools round trip per step.
+
+Each step reuses the underlying note/category tool, so behaviour (category
+name resolution, run memo invalidation, error format) is identical to
+calling those tools directly.
+"""
+
+import asyncio
+import re
+from typing import Any
+
+from langchain.tools import tool, ToolRuntime
+from my_agent.tools.notes import (
+    get_user_notes,
+    search_user_notes,
+    create_note,
+    create_multiple_notes,
+    update_note,
+    edit_note,
+    delete_note,
+)
+from my_agent.tools.categories import (
+    get_user_categories,
+    create_category,
+    update_category,
+    delete_category,
+    assign_notes_to_category,
+)
+
+
+# Operations a plan step may use
+PLAN_ACTIONS = {
+    t.name: t for t in [
+        get_user_notes,
+        search_user_notes,
+        create_note,
+        create_multiple_notes,
+        update_note,
+        edit_note,
+        delete_note,
+        get_user_categories,
+        create_category,
+        update_category,
+        delete_category,
+        assign_notes_to_category,
+    ]
+}
+
+# Actions that only read; every other action writes
+READ_ACTIONS = {"get_user_notes", "search_user_notes", "get_user_categories"}
+
+# "$step_id" or "$step_id.path.to.field". Only names of earlier steps count
+# as references; anything else (e.g. "$USD") is literal text, and "$$name"
+# is the escape for a literal "$name" that is also a step id.
+_REFERENCE_PATTERN = re.compile(r"^\$([A-Za-z_]\w*)((?:\.\w+)*)$")
+
+
+def _match_reference(value: str, step_ids: set[str]) -> re.Match | None:
+    match = _REFERENCE_PATTERN.match(value)
+    return match if match and match.group(1) in step_ids else None
+
+
+def _find_references(value: Any, step_ids: set[str]) -> set[str]:
+    """Collect the earlier step ids referenced anywhere inside a step's args."""
+    if isinstance(value, str):
+        match = _match_reference(value, step_ids)
+        return {match.group(1)} if match else set()
+    if isinstance(value, dict):
+        return set().union(*(_find_references(v, step_ids) for v in value.values()))
+    if isinstance(value, list):
+        return set().union(*(_find_references(v, step_ids) for v in value))
+    return set()
+
+
+def _find_id(value: Any) -> Any:
+    """Depth-first search for the first '_id' or 'id' field in a result."""
+    if isinstance(value, dict):
+        for key in ("_id", "id"):
+            if key in value and not isinstance(value[key], (dict, list)):
+                return value[key]
+        for item in value.values():
+            found = _find_id(item)
+            if found is not None:
+                return found
+    if isinstance(value, list):
+        for item in value:
+            found = _find_id(item)
+            if found is not None:
+                return found
+    return None
+
+
+def _lookup(result: Any, path: list[str]) -> Any:
+    """
+    Follow a dotted path into a step result. A final "id" that isn't
+    present falls back to the first '_id'/'id' found in the result.
+    """
+    current = result
+    for index, key in enumerate(path):
+        if isinstance(current, dict) and key in current:
+            current = current[key]
+        elif isinstance(current, list) and key.isdigit() and int(key) < len(current):
+            current = current[int(key)]
+        elif key == "id" and index == len(path) - 1:
+            current = _find_id(current)
+        else:
+            raise ValueError(f"Field '{'.'.join(path)}' not found in step result")
+    return current
+
+
+def _substitute(value: Any, results: dict[str, Any], step_ids: set[str]) -> Any:
+    """Replace references to `step_ids` in args with values from their results."""
+    if isinstance(value, str):
+        if value.startswith("$$") and _REFERENCE_PATTERN.match(value[1:]):
+            return value[1:]
+        match = _match_reference(value, step_ids)
+        if not match:
+            return value
+        path = [p for p in match.group(2).split(".") if p]
+        return _lookup(results[match.group(1)], path) if path else results[match.group(1)]
+    if isinstance(value, dict):
+        return {k: _substitute(v, results, step_ids) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_substitute(v, results, step_ids) for v in value]
+    return value
+
+
+def _validate_plan(steps: list[dict]) -> dict[str, set[str]]:
+    """
+    Check step ids, actions and references; return each step's dependencies.
+    Steps may only depend on steps that appear before them, so plans can't cycle.
+    """
+    dependencies: dict[str, set[str]] = {}
+    for position, step in enumerate(steps):
+        step_id = step.get("id") or f"step{position + 1}"
+        step["id"] = step_id
+        if step_id in dependencies:
+            raise ValueError(f"Duplicate step id '{step_id}'")
+        if step.get("action") not in PLAN_ACTIONS:
+            raise ValueError(
+                f"Step '{step_id}' has unknown action '{step.get('action')}'. "
+                f"Allowed actions: {', '.join(PLAN_ACTIONS)}"
+            )
+
+        depends_on = (
+            _find_references(step.get("args", {}), set(dependencies))
+            | set(step.get("after", []))
+        )
+        unknown = depends_on - dependencies.keys()
+        if unknown:
+            raise ValueError(
+                f"Step '{step_id}' depends on {', '.join(sorted(unknown))}, "
+                "which must be earlier steps in the plan"
+            )
+        dependencies[step_id] = depends_on
+    return dependencies
+
+
+def _plan_order(steps: list[dict]) -> dict[str, set[str]]:
+    """
+    Steps each step must wait for to keep writes in plan order: a write
+    waits for every earlier step, a read waits for the last earlier write.
+    Runs of consecutive reads still run concurrently.
+    """
+    order: dict[str, set[str]] = {}
+    last_write: set[str] = set()
+    since_write: set[str] = set()
+    for step in steps:
+        if step["action"] in READ_ACTIONS:
+            order[step["id"]] = set(last_write)
+            since_write.add(step["id"])
+        else:
+            order[step["id"]] = last_write | since_write
+            last_write, since_write = {step["id"]}, set()
+    return order
+
+
+@tool
+async def execute_plan(
+    steps: list[dict],
+    runtime: ToolRuntime = None,
+) -> dict:
+    """
+    Run several note/category operations in one call. Prefer this over
+    separate tool calls whenever a request needs more than one operation.
+
+    Steps that change notes or categories run one at a time in plan order;
+    reads between them run at the same time. A step can use a value from an
+    earlier step's result with "$<step id>.<field>", e.g. "$recipes.id" for
+    the ID of a category created in step "recipes" ("$$recipes" is the
+    literal text "$recipes"). A step is skipped if a step it references (or
+    lists in "after") failed.
+
+    Args:
+        steps: Ordered list of steps, each with:
+            - id: Short step name to reference it by (e.g. "recipes")
+            - action: One of get_user_notes, search_user_notes, create_note,
+              create_multiple_notes, update_note, edit_note, delete_note, get_user_categories,
+              create_category, update_category, delete_category, assign_notes_to_category
+            - args: Arguments for that action, exactly as for the tool itself
+            - after: Optional list of step ids that must finish first
+
+    Returns:
+        Dictionary with the result of every step, in plan order
+    """
+    try:
+        dependencies = _validate_plan(steps)
+    except Exception as e:
+        return {"error": str(e), "success": False}
+    order = _plan_order(steps)
+
+    results: dict[str, Any] = {}
+    failed: set[str] = set()
+    done: dict[str, asyncio.Event] = {step["id"]: asyncio.Event() for step in steps}
+
+    async def run_step(step: dict) -> None:
+        step_id = step["id"]
+        try:
+            for dependency in dependencies[step_id] | order[step_id]:
+                await done[dependency].wait()
+
+            failed_dependencies = dependencies[step_id] & failed
+            if failed_dependencies:
+                results[step_id] = {
+                    "error": f"Skipped because {', '.join(sorted(failed_dependencies))} failed",
+                    "success": False,
+                }
+            else:
+                args = _substitute(step.get("args", {}), results, dependencies[step_id])
+                action = PLAN_ACTIONS[step["action"]]
+                results[step_id] = await action.coroutine(**args, runtime=runtime)
+        except Exception as e:
+            results[step_id] = {"error": str(e), "success": False}
+        finally:
+            if isinstance(results.get(step_id), dict) and "error" in results[step_id]:
+                failed.add(step_id)
+            done[step_id].set()
+
+    await asyncio.gather(*[run_step(step) for step in steps])
+
+    return {
+        "success": not failed,
+        "steps": [
+            {"id": step["id"], "action": step["action"], "result": results[step["id"]]}
+            for step in steps
+        ],
+    }
@@ -0,0 +1,129 @@
+"""
+Per-user category name → ID index.
+
+Lets tools accept category names ("Work") as well as MongoDB IDs, so the
+LLM doesn't need a get_user_categories round trip before filing notes.
+Indexes are cached per user for CATEGORY_INDEX_TTL seconds and dropped
+by the category tools whenever categories are created, renamed or deleted.
+Renames and deletes resolve names with exact=True, so a typo can't fuzzily
+match (and destroy) a different category.
+"""
+
+import asyncio
+import difflib
+import re
+import time
+from collections import OrderedDict
+from typing import Any, Optional
+
+from my_agent.utils.express_client import express_client
+
+
+CATEGORY_INDEX_TTL = 300.0
+CATEGORY_INDEX_MAX_USERS = 1000
+FUZZY_MATCH_CUTOFF = 0.8
+
+_OBJECT_ID_PATTERN = re.compile(r"^[0-9a-fA-F]{24}$")
+
+# user_id -> (fetched_at, {normalized name: category id}, {normalized name: display name})
+_indexes: "OrderedDict[str, tuple[float, dict[str, str], dict[str, str]]]" = OrderedDict()
+_locks: dict[str, asyncio.Lock] = {}
+
+
+def _normalize(name: str) -> str:
+    return " ".join(name.split()).casefold()
+
+
+def _extract_categories(result: Any) -> list[dict]:
+    """Pull the category list out of an Express categories response."""
+    if isinstance(result, list):
+        return result
+    if isinstance(result, dict):
+        for key in ("categories", "data"):
+            if isinstance(result.get(key), list):
+                return result[key]
+    return []
+
+
+def update_index(user_id: str, categories_result: Any) -> None:
+    """Rebuild a user's index from a GET /categories response."""
+    ids: dict[str, str] = {}
+    names: dict[str, str] = {}
+    for category in _extract_categories(categories_result):
+        if not isinstance(category, dict):
+            continue
+        category_id = category.get("_id") or category.get("id")
+        name = category.get("name")
+        if category_id and name:
+            ids[_normalize(name)] = str(category_id)
+            names[_normalize(name)] = name
+
+    _indexes[user_id] = (time.monotonic(), ids, names)
+    _indexes.move_to_end(user_id)
+    while len(_indexes) > CATEGORY_INDEX_MAX_USERS:
+        evicted, _ = _indexes.popitem(last=False)
+        _locks.pop(evicted, None)
+
+
+def invalidate(user_id: str) -> None:
+    """Forget a user's index so the next lookup refetches it."""
+    _indexes.pop(user_id, None)
+
+
+async def _get_index(user_id: str, refresh: bool = False) -> tuple[dict[str, str], dict[str, str]]:
+    lock = _locks.setdefault(user_id, asyncio.Lock())
+    async with lock:
+        cached = _indexes.get(user_id)
+        if not refresh and cached and time.monotonic() - cached[0] < CATEGORY_INDEX_TTL:
+            return cached[1], cached[2]
+
+        result = await express_client.get(f"/api/agent/categories/{user_id}")
+        update_index(user_id, result)
+        _, ids, names = _indexes[user_id]
+        return ids, names
+
+
+def _match(ids: dict[str, str], name: str, exact: bool = False) -> Optional[str]:
+    key = _normalize(name)
+    if key in ids:
+        return ids[key]
+    if exact:
+        return None
+    close = difflib.get_close_matches(key, ids.keys(), n=1, cutoff=FUZZY_MATCH_CUTOFF)
+    return ids[close[0]] if close else None
+
+
+async def resolve_category_id(user_id: str, category: str, exact: bool = False) -> str:
+    """
+    Resolve a category ID or name to a category ID.
+
+    IDs (24 hex chars) and "null" are returned unchanged. Names are matched
+    case-insensitively, then fuzzily unless `exact` is set; the index is
+    refetched once before giving up. Raises ValueError listing the user's
+    categories if nothing matches.
+    """
+    if category == "null" or _OBJECT_ID_PATTERN.match(category):
+        return category
+
+    ids, names = await _get_index(user_id)
+    category_id = _match(ids, category, exact)
+    if category_id is None:
+        ids, names = await _get_index(user_id, refresh=True)
+        category_id = _match(ids, category, exact)
+
+    if category_id is None:
+        available = ", ".join(sorted(names.values())) or "none"
+        raise ValueError(f"No category named '{category}'. Available categories: {available}")
+    return category_id
+
+
+def category_name(user_id: str, category_id: str) -> Optional[str]:
+    """Display name of a category ID from the cached index, or None if it isn't indexed."""
+    cached = _indexes.get(user_id)
+    if cached is None:
+        return None
+    _, ids, names = cached
+    for key, indexed_id in ids.items():
+        if indexed_id == category_id:
+            return names[key]
+    return None
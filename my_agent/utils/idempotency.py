@@ -0,0 +1,71 @@
+"""
+In-flight deduplication and short-lived result caching for /chat.
+
+Requests with the same idempotency key share one graph run: the first
+starts it, duplicates arriving while it runs await the same task, and
+duplicates arriving within `ttl` seconds after it finished get the cached
+result. Failed runs are not cached, so a retry after an error runs again.
+"""
+
+import asyncio
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Optional
+
+
+def derive_idempotency_key(user_id: str, conversation_history: list[dict]) -> str:
+    """Hash of the user ID and the full conversation history."""
+    payload = json.dumps(
+        {"user_id": user_id, "history": conversation_history},
+        sort_keys=True,
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class RequestDeduplicator:
+    """Shares in-flight runs and caches completed results by key."""
+
+    def __init__(self, ttl: float = 60.0, max_results: int = 1000):
+        self.ttl = ttl
+        self.max_results = max_results
+        self._in_flight: dict[str, asyncio.Task] = {}
+        self._results: "OrderedDict[str, tuple[float, Any]]" = OrderedDict()
+
+    def _cached(self, key: str) -> Optional[tuple[float, Any]]:
+        now = time.monotonic()
+        while self._results:
+            oldest_key, (finished_at, _) = next(iter(self._results.items()))
+            if now - finished_at < self.ttl:
+                break
+            self._results.popitem(last=False)
+        return self._results.get(key)
+
+    def _store(self, key: str, result: Any) -> None:
+        self._results[key] = (time.monotonic(), result)
+        self._results.move_to_end(key)
+        while len(self._results) > self.max_results:
+            self._results.popitem(last=False)
+
+    async def run(self, key: str, factory: Callable[[], Awaitable[Any]]) -> Any:
+        """Return the result for `key`, running `factory` only if no run is cached or in flight."""
+        cached = self._cached(key)
+        if cached is not None:
+            return cached[1]
+
+        task = self._in_flight.get(key)
+        if task is None:
+            task = asyncio.create_task(factory())
+            self._in_flight[key] = task
+
+            def on_done(finished: asyncio.Task) -> None:
+                self._in_flight.pop(key, None)
+                if not finished.cancelled() and finished.exception() is None:
+                    self._store(key, finished.result())
+
+            task.add_done_callback(on_done)
+
+        # Shield so one caller disconnecting doesn't cancel the run for the others
+        return await asyncio.shield(task)
@@ -0,0 +1,220 @@
+"""
+Background job execution for long-running chat requests.
+
+A JobPool runs submitted payloads on a fixed number of worker tasks,
+highest priority first, and keeps job state in a JobStore. Any store
+that implements create/get/update/delete can be plugged in (e.g. Redis
+or MongoDB); InMemoryJobStore is the default for a single instance.
+
+When a job finishes and has a callback_endpoint, the result is POSTed
+to that Express endpoint through the shared express_client. Callback
+endpoints must be plain paths under one of CHAT_JOB_CALLBACK_PREFIXES,
+since the request carries SERVICE_SECRET.
+"""
+
+import asyncio
+import itertools
+import os
+import re
+import time
+import uuid
+from abc import ABC, abstractmethod
+from typing import Any, Awaitable, Callable, Optional
+
+from my_agent.utils.express_client import express_client
+
+
+# Comma-separated path prefixes a job's callback_endpoint must start with
+CHAT_JOB_CALLBACK_PREFIXES = [
+    prefix.strip()
+    for prefix in os.getenv("CHAT_JOB_CALLBACK_PREFIXES", "/api/agent/").split(",")
+    if prefix.strip()
+]
+
+# One or more "/segment" parts of unreserved URL characters: no scheme,
+# host, userinfo ("@"), query, fragment or backslashes
+_CALLBACK_PATH_PATTERN = re.compile(r"^(/[A-Za-z0-9._~-]+)+/?$")
+
+
+class JobQueueFullError(Exception):
+    """Raised when a job is submitted while the queue is at capacity."""
+
+
+def validate_callback_endpoint(endpoint: str) -> str:
+    """
+    Check that a callback endpoint is a plain Express path under one of
+    CHAT_JOB_CALLBACK_PREFIXES, so a job can't send the service token to
+    another host or escape the allowed routes.
+
+    Args:
+        endpoint: Path to POST the job result to, e.g. "/api/agent/jobs/done"
+
+    Returns:
+        The endpoint, unchanged
+
+    Raises:
+        ValueError: If the endpoint is not an allowed path
+    """
+    if not _CALLBACK_PATH_PATTERN.match(endpoint):
+        raise ValueError("callback_endpoint must be a plain path starting with '/'")
+    if any(segment in (".", "..") for segment in endpoint.split("/")):
+        raise ValueError("callback_endpoint must not contain '.' or '..' segments")
+    if not any(endpoint.startswith(prefix) for prefix in CHAT_JOB_CALLBACK_PREFIXES):
+        raise ValueError(
+            f"callback_endpoint must start with one of: {', '.join(CHAT_JOB_CALLBACK_PREFIXES)}"
+        )
+    return endpoint
+
+
+class JobStore(ABC):
+    """Interface for job state storage."""
+
+    @abstractmethod
+    async def create(self, job: dict[str, Any]) -> None:
+        """Store a new job record."""
+
+    @abstractmethod
+    async def get(self, job_id: str) -> Optional[dict[str, Any]]:
+        """Return a copy of the job record, or None if it doesn't exist."""
+
+    @abstractmethod
+    async def update(self, job_id: str, **fields: Any) -> None:
+        """Update fields of an existing job record."""
+
+    @abstractmethod
+    async def delete(self, job_id: str) -> None:
+        """Remove a job record if it exists."""
+
+
+class InMemoryJobStore(JobStore):
+    """
+    Process-local job store. Finished jobs are dropped after `ttl` seconds.
+    Jobs are lost on restart and not shared between instances.
+    """
+
+    def __init__(self, ttl: float = 3600.0):
+        self.ttl = ttl
+        self._jobs: dict[str, dict[str, Any]] = {}
+
+    def _evict_expired(self) -> None:
+        cutoff = time.time() - self.ttl
+        expired = [
+            job_id for job_id, job in self._jobs.items()
+            if job.get("finished_at") and job["finished_at"] < cutoff
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+    async def create(self, job: dict[str, Any]) -> None:
+        self._evict_expired()
+        self._jobs[job["job_id"]] = dict(job)
+
+    async def get(self, job_id: str) -> Optional[dict[str, Any]]:
+        job = self._jobs.get(job_id)
+        return dict(job) if job is not None else None
+
+    async def update(self, job_id: str, **fields: Any) -> None:
+        if job_id in self._jobs:
+            self._jobs[job_id].update(fields)
+
+    async def delete(self, job_id: str) -> None:
+        self._jobs.pop(job_id, None)
+
+
+class JobPool:
+    """Bounded worker pool with a priority queue (higher priority runs first)."""
+
+    def __init__(
+        self,
+        runner: Callable[[Any], Awaitable[Any]],
+        store: JobStore,
+        workers: int = 4,
+        max_queue_size: int = 100,
+    ):
+        self.runner = runner
+        self.store = store
+        self.workers = workers
+        self._queue: asyncio.PriorityQueue = asyncio.PriorityQueue(maxsize=max_queue_size)
+        self._sequence = itertools.count()
+        self._tasks: list[asyncio.Task] = []
+
+    def start(self) -> None:
+        self._tasks = [
+            asyncio.create_task(self._worker(), name=f"chat-job-worker-{i}")
+            for i in range(self.workers)
+        ]
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def submit(
+        self,
+        payload: Any,
+        priority: int = 0,
+        callback_endpoint: Optional[str] = None,
+    ) -> dict[str, Any]:
+        """Queue a payload and return its job record."""
+        if callback_endpoint is not None:
+            validate_callback_endpoint(callback_endpoint)
+        if self._queue.full():
+            raise JobQueueFullError("Job queue is full, try again later")
+
+        job = {
+            "job_id": uuid.uuid4().hex,
+            "status": "queued",
+            "priority": priority,
+            "callback_endpoint": callback_endpoint,
+            "created_at": time.time(),
+            "started_at": None,
+            "finished_at": None,
+            "result": None,
+            "error": None,
+        }
+        await self.store.create(job)
+        try:
+            # PriorityQueue pops the smallest item; the sequence keeps FIFO order within a priority
+            self._queue.put_nowait((-priority, next(self._sequence), job["job_id"], payload))
+        except asyncio.QueueFull:
+            # Other submits filled the queue while the store write was pending
+            await self.store.delete(job["job_id"])
+            raise JobQueueFullError("Job queue is full, try again later")
+        return job
+
+    async def _worker(self) -> None:
+        while True:
+            _, _, job_id, payload = await self._queue.get()
+            try:
+                await self._run_job(job_id, payload)
+            finally:
+                self._queue.task_done()
+
+    async def _run_job(self, job_id: str, payload: Any) -> None:
+        await self.store.update(job_id, status="running", started_at=time.time())
+        try:
+            result = await self.runner(payload)
+            fields = {"status": "succeeded", "result": result}
+        except Exception as e:
+            print(f"Chat job {job_id} failed: {e}")
+            fields = {"status": "failed", "error": str(e)}
+
+        await self.store.update(job_id, finished_at=time.time(), **fields)
+
+        job = await self.store.get(job_id)
+        if job and job.get("callback_endpoint"):
+            await self._send_callback(job)
+
+    async def _send_callback(self, job: dict[str, Any]) -> None:
+        try:
+            # Checked again here since jobs may come from a shared store
+            endpoint = validate_callback_endpoint(job["callback_endpoint"])
+            await express_client.post(endpoint, {
+                "jobId": job["job_id"],
+                "status": job["status"],
+                "response": job["result"],
+                "error": job["error"],
+            })
+        except Exception as e:
+            print(f"Callback for chat job {job['job_id']} failed: {e}")
@@ -0,0 +1,106 @@
+"""
+Compaction of stale tool outputs before they are re-sent to the LLM.
+
+Every agent iteration re-sends the whole message list, including the
+full JSON of tool results the model already read in earlier iterations.
+compact_tool_messages replaces those consumed results with short digests
+(IDs, titles and counts) once they exceed TOOL_OUTPUT_TOKEN_BUDGET.
+
+Only the list sent to the LLM is compacted; state["messages"] keeps the
+original ToolMessages.
+"""
+
+import json
+import os
+from typing import Any, Sequence
+
+from langchain_core.messages import AIMessage, BaseMessage, ToolMessage
+
+
+TOOL_OUTPUT_TOKEN_BUDGET = int(os.getenv("TOOL_OUTPUT_TOKEN_BUDGET", 4000))
+DIGEST_MAX_ITEMS = 20
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about 4 characters per token)."""
+    return len(text) // 4 + 1
+
+
+def _content_text(message: BaseMessage) -> str:
+    return message.content if isinstance(message.content, str) else json.dumps(message.content, default=str)
+
+
+def _describe_item(item: Any) -> str:
+    if not isinstance(item, dict):
+        return str(item)[:40]
+    item_id = item.get("_id") or item.get("id")
+    label = item.get("title") or item.get("name")
+    if item_id and label:
+        return f"{item_id} ({str(label)[:40]})"
+    return str(item_id or label or "?")
+
+
+def _digest(data: Any) -> str:
+    """Summarize a parsed tool result: scalar fields, and IDs/titles of list items."""
+    if isinstance(data, list):
+        data = {"items": data}
+    if not isinstance(data, dict):
+        return str(data)[:200]
+
+    parts = []
+    for key, value in data.items():
+        if isinstance(value, list):
+            described = ", ".join(_describe_item(item) for item in value[:DIGEST_MAX_ITEMS])
+            more = f", +{len(value) - DIGEST_MAX_ITEMS} more" if len(value) > DIGEST_MAX_ITEMS else ""
+            parts.append(f"{key}: {len(value)} items [{described}{more}]")
+        elif isinstance(value, dict):
+            parts.append(f"{key}: {_describe_item(value)}")
+        else:
+            parts.append(f"{key}: {str(value)[:80]}")
+    return "; ".join(parts)
+
+
+def _compact(message: ToolMessage) -> ToolMessage:
+    text = _content_text(message)
+    try:
+        summary = _digest(json.loads(text))
+    except (json.JSONDecodeError, TypeError):
+        summary = text[:200]
+    return ToolMessage(
+        content=f"[Earlier {message.name or 'tool'} result, compacted] {summary}",
+        tool_call_id=message.tool_call_id,
+        name=message.name,
+        id=message.id,
+        status=message.status,
+    )
+
+
+def compact_tool_messages(
+    messages: Sequence[BaseMessage],
+    token_budget: int = TOOL_OUTPUT_TOKEN_BUDGET,
+) -> list[BaseMessage]:
+    """
+    Return a copy of messages with consumed tool outputs compacted.
+
+    A ToolMessage is consumed once an AIMessage follows it. Results the model
+    hasn't seen yet are never compacted; consumed results are kept in full
+    newest-first while they fit in token_budget, older ones become digests.
+    """
+    last_ai_index = max(
+        (i for i, message in enumerate(messages) if isinstance(message, AIMessage)),
+        default=-1,
+    )
+
+    compacted = list(messages)
+    remaining = token_budget
+    for i in range(last_ai_index - 1, -1, -1):
+        message = messages[i]
+        if not isinstance(message, ToolMessage):
+            continue
+        tokens = estimate_tokens(_content_text(message))
+        if tokens <= remaining:
+            remaining -= tokens
+        else:
+            compacted[i] = _compact(message)
+            remaining = 0
+    return compacted
@@ -0,0 +1,281 @@
+"""
+Opt-in per-request profiling and event-loop lag monitoring.
+
+Profiling a /chat call (header "X-Mage-Profile: 1" or PROFILE_SAMPLE_RATE)
+collects two things:
+    - a span timeline of the graph run (nodes, LLM calls, tools) through
+      LangChain callbacks
+    - a sampling profile of the event-loop thread, taken by a helper thread
+      reading the loop thread's current stack every few milliseconds
+
+The sampling profile sees everything running on the loop, so concurrent
+requests show up in each other's profiles; use it on a quiet instance.
+
+The loop lag monitor (LOOP_LAG_MONITOR=1) runs a heartbeat task on the
+loop and a watchdog thread. When the heartbeat stalls longer than
+LOOP_LAG_THRESHOLD_MS, the watchdog prints the loop thread's stack, which
+points at the blocking call.
+"""
+
+import asyncio
+import json
+import os
+import random
+import sys
+import threading
+import time
+import traceback
+import uuid
+from collections import Counter
+from typing import Any, Optional
+from uuid import UUID
+
+from langchain_core.callbacks import AsyncCallbackHandler
+
+
+PROFILE_HEADER_VALUES = {"1", "true", "yes"}
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", 0))
+PROFILE_OUTPUT_DIR = os.getenv("PROFILE_OUTPUT_DIR", "profiles")
+SAMPLE_INTERVAL_SECONDS = 0.005
+TOP_STACKS = 15
+
+
+def should_profile(header_value: Optional[str]) -> bool:
+    """Decide whether to profile this request from the header or the sampling rate."""
+    if header_value is not None and header_value.strip().lower() in PROFILE_HEADER_VALUES:
+        return True
+    return PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+
+
+class SpanRecorder(AsyncCallbackHandler):
+    """Records start/end offsets of graph nodes, LLM calls and tool calls."""
+
+    def __init__(self):
+        self.origin = time.perf_counter()
+        self.spans: dict[UUID, dict[str, Any]] = {}
+
+    def _start(self, run_id: UUID, parent_run_id: Optional[UUID], kind: str, name: str) -> None:
+        self.spans[run_id] = {
+            "kind": kind,
+            "name": name,
+            "parent": str(parent_run_id) if parent_run_id else None,
+            "start": time.perf_counter() - self.origin,
+            "end": None,
+            "error": None,
+        }
+
+    def _end(self, run_id: UUID, error: Optional[BaseException] = None) -> None:
+        span = self.spans.get(run_id)
+        if span is not None:
+            span["end"] = time.perf_counter() - self.origin
+            if error is not None:
+                span["error"] = str(error)
+
+    async def on_chain_start(self, serialized, inputs, *, run_id, parent_run_id=None, **kwargs):
+        name = kwargs.get("name") or (serialized or {}).get("name") or "chain"
+        self._start(run_id, parent_run_id, "chain", name)
+
+    async def on_chain_end(self, outputs, *, run_id, **kwargs):
+        self._end(run_id)
+
+    async def on_chain_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, error)
+
+    async def on_chat_model_start(self, serialized, messages, *, run_id, parent_run_id=None, **kwargs):
+        name = kwargs.get("name") or (serialized or {}).get("name") or "llm"
+        self._start(run_id, parent_run_id, "llm", name)
+
+    async def on_llm_end(self, response, *, run_id, **kwargs):
+        self._end(run_id)
+
+    async def on_llm_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, error)
+
+    async def on_tool_start(self, serialized, input_str, *, run_id, parent_run_id=None, **kwargs):
+        name = kwargs.get("name") or (serialized or {}).get("name") or "tool"
+        self._start(run_id, parent_run_id, "tool", name)
+
+    async def on_tool_end(self, output, *, run_id, **kwargs):
+        self._end(run_id)
+
+    async def on_tool_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, error)
+
+    def timeline(self) -> list[dict[str, Any]]:
+        """Spans ordered by start time, with durations in milliseconds."""
+        spans = []
+        for run_id, span in self.spans.items():
+            end = span["end"] if span["end"] is not None else time.perf_counter() - self.origin
+            spans.append({
+                "id": str(run_id),
+                **span,
+                "start_ms": round(span["start"] * 1000, 2),
+                "duration_ms": round((end - span["start"]) * 1000, 2),
+            })
+        for span in spans:
+            del span["start"], span["end"]
+        return sorted(spans, key=lambda s: s["start_ms"])
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}:{frame.f_lineno}"
+
+
+class SamplingProfiler:
+    """Samples the stack of one thread from a background thread."""
+
+    def __init__(self, thread_id: Optional[int] = None, interval: float = SAMPLE_INTERVAL_SECONDS):
+        self.thread_id = thread_id or threading.get_ident()
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name="mage-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            labels = []
+            while frame is not None:
+                labels.append(_frame_label(frame))
+                frame = frame.f_back
+            self.stacks[";".join(reversed(labels))] += 1
+            self.samples += 1
+
+    def top_stacks(self, limit: int = TOP_STACKS) -> list[dict[str, Any]]:
+        """Most frequently sampled stacks (collapsed, root first)."""
+        return [
+            {"stack": stack, "samples": count}
+            for stack, count in self.stacks.most_common(limit)
+        ]
+
+
+class RequestProfile:
+    """
+    Profiling session for a single /chat call, used as an async context
+    manager. Stopping the sampler and writing the report run in a worker
+    thread so they don't block the event loop.
+    """
+
+    def __init__(self):
+        self.profile_id = uuid.uuid4().hex[:12]
+        self.spans = SpanRecorder()
+        self.profiler = SamplingProfiler()
+        self.started = time.perf_counter()
+
+    async def __aenter__(self) -> "RequestProfile":
+        self.profiler.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        total_ms = (time.perf_counter() - self.started) * 1000
+        timeline = self.spans.timeline()
+        await asyncio.to_thread(self._finish, total_ms, timeline)
+
+    def _finish(self, total_ms: float, timeline: list[dict[str, Any]]) -> None:
+        self.profiler.stop()
+        self.report(total_ms, timeline)
+
+    def report(self, total_ms: float, timeline: list[dict[str, Any]]) -> None:
+        """Print a short summary and write the full profile to PROFILE_OUTPUT_DIR."""
+
+        print(f"[profile {self.profile_id}] total {total_ms:.1f} ms, "
+              f"{self.profiler.samples} samples, {len(timeline)} spans")
+        for span in timeline:
+            if span["kind"] in ("llm", "tool"):
+                print(f"  {span['start_ms']:>9.1f} ms  +{span['duration_ms']:>8.1f} ms  "
+                      f"{span['kind']:<4} {span['name']}")
+
+        os.makedirs(PROFILE_OUTPUT_DIR, exist_ok=True)
+        path = os.path.join(PROFILE_OUTPUT_DIR, f"{self.profile_id}.json")
+        with open(path, "w", encoding="utf-8") as file:
+            json.dump({
+                "profile_id": self.profile_id,
+                "total_ms": round(total_ms, 2),
+                "sample_interval_ms": self.profiler.interval * 1000,
+                "samples": self.profiler.samples,
+                "timeline": timeline,
+                "top_stacks": self.profiler.top_stacks(),
+            }, file, indent=2)
+
+
+class LoopLagMonitor:
+    """
+    Detects event-loop stalls and prints the stack of the blocking code.
+
+    A heartbeat task on the loop updates a timestamp; a watchdog thread
+    compares it against wall time and dumps the loop thread's stack once
+    per stall.
+    """
+
+    def __init__(self, threshold_ms: float = 100.0, interval: float = 0.05):
+        self.threshold = threshold_ms / 1000
+        self.interval = interval
+        self.max_lag_ms = 0.0
+        self.stall_count = 0
+        self._heartbeat = time.monotonic()
+        self._loop_thread_id: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stop = threading.Event()
+        self._watchdog: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self._loop_thread_id = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        self._task = asyncio.create_task(self._beat())
+        self._watchdog = threading.Thread(target=self._watch, name="mage-loop-watchdog", daemon=True)
+        self._watchdog.start()
+
+    async def stop(self) -> None:
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        if self._watchdog is not None:
+            self._watchdog.join()
+        print(f"Loop lag monitor: {self.stall_count} stalls, max lag {self.max_lag_ms:.1f} ms")
+
+    async def _beat(self) -> None:
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            lag_ms = max(0.0, time.monotonic() - expected) * 1000
+            self.max_lag_ms = max(self.max_lag_ms, lag_ms)
+            self._heartbeat = time.monotonic()
+
+    def _watch(self) -> None:
+        reported_heartbeat = None
+        while not self._stop.wait(self.interval):
+            heartbeat = self._heartbeat
+            stalled_for = time.monotonic() - heartbeat - self.interval
+            if stalled_for < self.threshold or heartbeat == reported_heartbeat:
+                continue
+
+            reported_heartbeat = heartbeat
+            self.stall_count += 1
+            frame = sys._current_frames().get(self._loop_thread_id)
+            stack = "".join(traceback.format_stack(frame)) if frame is not None else "<no frame>"
+            print(f"Event loop blocked for {stalled_for * 1000:.0f}+ ms at:\n{stack}")
+
+
+def create_loop_lag_monitor() -> Optional[LoopLagMonitor]:
+    """Build the monitor when LOOP_LAG_MONITOR=1, otherwise None."""
+    if os.getenv("LOOP_LAG_MONITOR") != "1":
+        return None
+    threshold_ms = float(os.getenv("LOOP_LAG_THRESHOLD_MS", "100"))
+    return LoopLagMonitor(threshold_ms=threshold_ms)
@@ -0,0 +1,137 @@
+"""
+Latency-aware ordering of LLM providers.
+
+Providers are grouped into quality tiers (PROVIDER_TIERS, e.g. "1,2,3|4,5"
+using get_llm's judge numbers). Tiers are always tried in order; within a
+tier, providers are ordered by expected time to a successful response:
+EWMA latency divided by the EWMA success rate. Providers with fewer than
+MIN_OBSERVATIONS calls go first (in configured order) so each gets warmed
+up, and a small fraction of requests explore a random order so stats for
+slower providers stay fresh.
+"""
+
+import math
+import os
+import random
+import time
+from typing import Any, Optional
+
+
+DEFAULT_PROVIDER_TIERS = "1,2,3|4,5"
+EWMA_ALPHA = 0.2
+MIN_OBSERVATIONS = 3
+EXPLORE_RATE = 0.05
+
+
+def _parse_tiers(spec: str) -> list[list[int]]:
+    return [
+        [int(judge) for judge in tier.split(",") if judge.strip()]
+        for tier in spec.split("|")
+        if tier.strip()
+    ]
+
+
+class ProviderStats:
+    """Exponentially weighted stats for one provider."""
+
+    def __init__(self):
+        self.latency: Optional[float] = None
+        self.tokens_per_second: Optional[float] = None
+        self.error_rate = 0.0
+        self.calls = 0
+        self.errors = 0
+        self.first_choice = 0
+        self.last_used: Optional[float] = None
+
+    def _ewma(self, current: Optional[float], value: float) -> float:
+        return value if current is None else EWMA_ALPHA * value + (1 - EWMA_ALPHA) * current
+
+    def record_success(self, elapsed: float, output_tokens: Optional[int]) -> None:
+        self.calls += 1
+        self.last_used = time.time()
+        self.latency = self._ewma(self.latency, elapsed)
+        self.error_rate = self._ewma(self.error_rate, 0.0)
+        if output_tokens and elapsed > 0:
+            self.tokens_per_second = self._ewma(self.tokens_per_second, output_tokens / elapsed)
+
+    def record_error(self) -> None:
+        self.calls += 1
+        self.errors += 1
+        self.last_used = time.time()
+        self.error_rate = self._ewma(self.error_rate, 1.0)
+
+    def expected_latency(self) -> Optional[float]:
+        """Expected seconds to a successful response, or None without enough data."""
+        if self.calls < MIN_OBSERVATIONS:
+            return None
+        if self.latency is None:
+            # Only errors so far
+            return float("inf")
+        return self.latency / max(1.0 - self.error_rate, 0.05)
+
+
+class ProviderSelector:
+    """Orders providers for each LLM call and exposes its stats as metrics."""
+
+    def __init__(self, tiers: list[list[int]], explore_rate: float = EXPLORE_RATE):
+        self.tiers = tiers
+        self.explore_rate = explore_rate
+        self.stats = {judge: ProviderStats() for tier in tiers for judge in tier}
+
+    def _order_tier(self, tier: list[int], explore: bool = True) -> list[int]:
+        if explore and len(tier) > 1 and random.random() < self.explore_rate:
+            return random.sample(tier, len(tier))
+
+        def sort_key(position_and_judge):
+            position, judge = position_and_judge
+            expected = self.stats[judge].expected_latency()
+            return (expected is not None, expected or 0.0, position)
+
+        return [judge for _, judge in sorted(enumerate(tier), key=sort_key)]
+
+    def ordered_providers(self, record: bool = True) -> list[int]:
+        """Providers to try for this call, best first; `record` counts the first choice."""
+        order = [judge for tier in self.tiers for judge in self._order_tier(tier)]
+        if order and record:
+            self.stats[order[0]].first_choice += 1
+        return order
+
+    def record_success(self, judge: int, elapsed: float, output_tokens: Optional[int] = None) -> None:
+        self.stats[judge].record_success(elapsed, output_tokens)
+
+    def record_error(self, judge: int) -> None:
+        self.stats[judge].record_error()
+
+    def snapshot(self) -> dict[str, Any]:
+        """
+        Current stats and ordering, for the metrics endpoint. Expected latency
+        is None when it isn't finite (too few calls, or only errors so far),
+        since infinity isn't valid JSON.
+        """
+        def finite_or_none(value: Optional[float]) -> Optional[float]:
+            return value if value is not None and math.isfinite(value) else None
+
+        return {
+            "tiers": self.tiers,
+            "current_order": [
+                judge for tier in self.tiers for judge in self._order_tier(tier, explore=False)
+            ],
+            "providers": {
+                str(judge): {
+                    "ewma_latency_s": stats.latency,
+                    "ewma_error_rate": stats.error_rate,
+                    "ewma_tokens_per_s": stats.tokens_per_second,
+                    "expected_latency_s": finite_or_none(stats.expected_latency()),
+                    "calls": stats.calls,
+                    "errors": stats.errors,
+                    "first_choice": stats.first_choice,
+                    "last_used": stats.last_used,
+                }
+                for judge, stats in self.stats.items()
+            },
+        }
+
+
+provider_selector = ProviderSelector(
+    _parse_tiers(os.getenv("PROVIDER_TIERS", DEFAULT_PROVIDER_TIERS))
+)
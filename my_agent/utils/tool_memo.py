@@ -0,0 +1,127 @@
+"""
+Run-scoped memoization for read tools.
+
+The memo lives in MageState["tool_memo"] and is created fresh for every
+graph invocation, so cached results never leak across /chat requests.
+Read tools look results up here before calling Express; write tools clear
+the memo once their Express call returns or fails (a timed-out write may
+still have been applied), so later reads in the same run see the change.
+
+Notes returned by any read are also kept in MageState["seen_notes"] (by ID)
+so edit_note can patch a note without the LLM resending its full content.
+Unlike the memo, seen_notes survives writes; edit_note re-checks a note
+against Express before patching it.
+"""
+
+import json
+from typing import Any, Awaitable, Callable
+
+
+# Reserved memo entry counting writes in this run. A read only stores its
+# result if no write happened while it was in flight, so a read running
+# alongside a write (ToolNode, execute_plan, speculative reads) can't put
+# pre-write data back into the memo after the write cleared it.
+_GENERATION_KEY = "__generation__"
+
+
+def _normalize_value(value: Any) -> Any:
+    if isinstance(value, str):
+        return value.strip()
+    # Some providers send integer arguments as floats (10.0)
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+
+def _make_key(tool_name: str, args: dict[str, Any]) -> str:
+    """Build a memo key from the tool name and normalized arguments."""
+    normalized = {
+        key: _normalize_value(value)
+        for key, value in args.items()
+        if value is not None
+    }
+    return f"{tool_name}:{json.dumps(normalized, sort_keys=True, default=str)}"
+
+
+def _get_memo(runtime) -> dict[str, Any] | None:
+    """Return the run memo dict from graph state, if the run has one."""
+    if runtime is None:
+        return None
+    return runtime.state.get("tool_memo")
+
+
+async def memoized_read(
+    runtime,
+    tool_name: str,
+    args: dict[str, Any],
+    fetch: Callable[[], Awaitable[dict]],
+) -> dict:
+    """
+    Return the cached result for this read call, or fetch and cache it.
+
+    Error results are never cached so a retry in the same run can succeed.
+    Notes in every successful result go to seen_notes, even when the result
+    isn't cached (no memo, or a write happened while it was in flight).
+    """
+    memo = _get_memo(runtime)
+    if memo is None:
+        result = await fetch()
+        if not (isinstance(result, dict) and "error" in result):
+            remember_notes(runtime, result)
+        return result
+
+    key = _make_key(tool_name, args)
+    if key in memo:
+        return memo[key]
+
+    generation = memo.get(_GENERATION_KEY, 0)
+    result = await fetch()
+    if isinstance(result, dict) and "error" in result:
+        return result
+
+    remember_notes(runtime, result)
+    if isinstance(result, dict) and memo.get(_GENERATION_KEY, 0) == generation:
+        memo[key] = result
+    return result
+
+
+def _find_notes(value: Any) -> list[dict]:
+    """Collect note-like dicts (with '_id' and 'content') from a tool result."""
+    if isinstance(value, dict):
+        if "_id" in value and "content" in value:
+            return [value]
+        return [note for item in value.values() for note in _find_notes(item)]
+    if isinstance(value, list):
+        return [note for item in value for note in _find_notes(item)]
+    return []
+
+
+def remember_notes(runtime, result: Any) -> None:
+    """Store every note found in a tool result in the run's seen_notes."""
+    if runtime is None:
+        return
+    seen_notes = runtime.state.get("seen_notes")
+    if seen_notes is None:
+        return
+    for note in _find_notes(result):
+        seen_notes[str(note["_id"])] = note
+
+
+def get_seen_note(runtime, note_id: str) -> dict | None:
+    """Return the last version of a note read during this run, if any."""
+    if runtime is None:
+        return None
+    return (runtime.state.get("seen_notes") or {}).get(note_id)
+
+
+def invalidate_run_memo(runtime) -> None:
+    """
+    Drop every cached read result for the current run. Write tools call this
+    in a `finally` around their Express call, since a write that raised or
+    timed out may still have been applied.
+    """
+    memo = _get_memo(runtime)
+    if memo is not None:
+        generation = memo.get(_GENERATION_KEY, 0)
+        memo.clear()
+        memo[_GENERATION_KEY] = generation + 1
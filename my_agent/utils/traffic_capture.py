@@ -0,0 +1,166 @@
+"""
+Opt-in traffic capture for load testing and replay.
+
+Set TRAFFIC_CAPTURE_FILE to a path to append one JSON line per event:
+    - "chat_request":     the anonymized ChatRequest
+    - "llm_response":     every LLM message returned to agent_node
+    - "express_response": every Express API response (or error)
+    - "chat_response":    the final text returned by /chat
+
+All events of one /chat call share a capture_id so replay.py can rebuild
+the conversation. In every event, the user ID is replaced by a stable hash
+and the user's name by "user". All other free text (chat messages, LLM
+output, tool-call arguments, note titles and content) is masked too, while
+IDs and structure are kept; lengths are kept so payload sizes stay
+realistic. Set TRAFFIC_CAPTURE_REDACT=0 to keep the text in clear.
+"""
+
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+import uuid
+from contextvars import ContextVar
+from typing import Any, Optional
+
+
+_current_capture: ContextVar[Optional[dict[str, Any]]] = ContextVar(
+    "current_capture", default=None
+)
+_write_lock = threading.Lock()
+
+
+def is_enabled() -> bool:
+    """True when TRAFFIC_CAPTURE_FILE is configured."""
+    return bool(os.getenv("TRAFFIC_CAPTURE_FILE"))
+
+
+def anonymize_user_id(user_id: str) -> str:
+    """Stable, non-reversible stand-in for a user ID (24 hex chars, like a MongoDB ID)."""
+    return hashlib.sha256(user_id.encode("utf-8")).hexdigest()[:24]
+
+
+def is_redacting() -> bool:
+    """True unless TRAFFIC_CAPTURE_REDACT=0 (mask all free text, not just identities)."""
+    return os.getenv("TRAFFIC_CAPTURE_REDACT", "1") != "0"
+
+
+def mask_text(text: str) -> str:
+    """Mask letters and digits while keeping length and whitespace."""
+    return re.sub(r"\w", "x", text)
+
+
+# Keys whose string values are structure or identifiers that replay needs
+# (message types, tool call IDs, MongoDB IDs, timestamps), never user text.
+_STRUCTURAL_KEYS = {
+    "type", "id", "_id", "tool_call_id", "role", "method", "endpoint",
+    "userId", "categoryId", "noteIds", "createdAt", "updatedAt", "nextCursor",
+}
+# LLM message fields holding provider-specific raw copies of the content/args
+_RAW_MESSAGE_KEYS = {"additional_kwargs", "response_metadata"}
+_ID_PATTERN = re.compile(r"^[0-9a-fA-F]{24}$")
+
+
+def _anonymize(value: Any, capture: dict[str, str], redact: bool, key: Optional[str] = None) -> Any:
+    """
+    Recursively anonymize a payload: the raw user ID becomes its hash and the
+    user's name becomes "user" everywhere. When redacting, every other free-text
+    string is masked too, except structural keys, MongoDB IDs and tool names.
+    """
+    if isinstance(value, str):
+        user_id = capture["user_id"]
+        if user_id:
+            value = value.replace(user_id, anonymize_user_id(user_id))
+        if capture["name_pattern"] is not None:
+            value = capture["name_pattern"].sub("user", value)
+        if redact and key not in _STRUCTURAL_KEYS and not _ID_PATTERN.match(value):
+            value = mask_text(value)
+        return value
+    if isinstance(value, dict):
+        # Tool calls ({"name", "args", "id", ...}) keep their tool name so replay can dispatch them
+        is_tool_call = "name" in value and "args" in value
+        return {
+            item_key: (
+                item if is_tool_call and item_key == "name"
+                else _anonymize(item, capture, redact, item_key)
+            )
+            for item_key, item in value.items()
+            if not (redact and item_key in _RAW_MESSAGE_KEYS)
+        }
+    if isinstance(value, list):
+        return [_anonymize(item, capture, redact, key) for item in value]
+    return value
+
+
+def _write(kind: str, data: dict[str, Any]) -> None:
+    """Append one anonymized event for the current capture to the capture file."""
+    capture = _current_capture.get()
+    if capture is None or not is_enabled():
+        return
+
+    event = {
+        "ts": time.time(),
+        "capture_id": capture["capture_id"],
+        "kind": kind,
+        "data": _anonymize(data, capture, is_redacting()),
+    }
+    line = json.dumps(event, default=str)
+    with _write_lock:
+        with open(os.getenv("TRAFFIC_CAPTURE_FILE"), "a", encoding="utf-8") as file:
+            file.write(line + "\n")
+
+
+def start_capture(user_id: str, user_name: str, conversation_history: list[dict]) -> None:
+    """Begin capturing a /chat call and record its anonymized request."""
+    if not is_enabled():
+        return
+
+    name = user_name.strip()
+    _current_capture.set({
+        "capture_id": uuid.uuid4().hex,
+        "user_id": user_id,
+        "name_pattern": (
+            re.compile(rf"\b{re.escape(name)}\b", re.IGNORECASE) if len(name) >= 2 else None
+        ),
+    })
+    _write("chat_request", {
+        "user_id": user_id,
+        "user_name": "user",
+        "conversation_history": [
+            {"role": msg["role"], "content": msg["content"]}
+            for msg in conversation_history
+        ],
+    })
+
+
+def record_llm(provider: int, message_dict: dict[str, Any], elapsed: float) -> None:
+    """Record an LLM response (as produced by langchain's message_to_dict)."""
+    _write("llm_response", {
+        "provider": provider,
+        "elapsed": elapsed,
+        "message": message_dict,
+    })
+
+
+def record_express(
+    method: str,
+    endpoint: str,
+    result: Optional[dict[str, Any]],
+    elapsed: float,
+    error: Optional[str] = None,
+) -> None:
+    """Record an Express API response or the error it raised."""
+    _write("express_response", {
+        "method": method,
+        "endpoint": endpoint,
+        "elapsed": elapsed,
+        "result": result,
+        "error": error,
+    })
+
+
+def record_chat_response(response: str) -> None:
+    """Record the final /chat response text."""
+    _write("chat_response", {"response": response, "redacted": is_redacting()})
@@ -0,0 +1,216 @@
+"""
+Deterministic replay of captured /chat traffic against main.app.
+
+Recordings are produced by running the agent with TRAFFIC_CAPTURE_FILE set
+(see my_agent/utils/traffic_capture.py). Replay sends every captured
+ChatRequest to main.app in-process, at the original arrival times divided
+by --speedup, while LLM and Express calls are answered from the recording
+instead of the network. Recorded LLM/Express latencies are simulated too
+(also divided by --speedup) unless --no-latency is given.
+
+Usage:
+    uv run replay.py captures.jsonl --speedup 10
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import time
+from collections import defaultdict, deque
+from contextvars import ContextVar
+from typing import Any, Optional
+
+import httpx
+from langchain_core.messages import AIMessageChunk, messages_from_dict
+
+# Never re-capture the traffic we are replaying
+os.environ.pop("TRAFFIC_CAPTURE_FILE", None)
+
+import main
+from my_agent.nodes import agent as agent_module
+from my_agent.utils.express_client import express_client
+from my_agent.utils.traffic_capture import mask_text
+
+
+_current_session: ContextVar[Optional["ReplaySession"]] = ContextVar(
+    "current_session", default=None
+)
+
+
+class ReplaySession:
+    """Recorded events of a single captured /chat call."""
+
+    def __init__(self, capture_id: str):
+        self.capture_id = capture_id
+        self.started_at: float = 0.0
+        self.request: Optional[dict[str, Any]] = None
+        self.recorded_response: Optional[str] = None
+        self.redacted = False
+        self.llm_responses: deque = deque()
+        self.express_responses: dict[tuple[str, str], deque] = defaultdict(deque)
+
+    def add_event(self, event: dict[str, Any]) -> None:
+        """Route a captured event into the matching queue."""
+        kind = event["kind"]
+        data = event["data"]
+        if kind == "chat_request":
+            self.started_at = event["ts"]
+            self.request = data
+        elif kind == "llm_response":
+            self.llm_responses.append(data)
+        elif kind == "express_response":
+            self.express_responses[(data["method"], data["endpoint"])].append(data)
+        elif kind == "chat_response":
+            self.recorded_response = data["response"]
+            self.redacted = bool(data.get("redacted"))
+
+
+class ReplayLLM:
+    """Stands in for a chat model and answers with the recorded responses."""
+
+    def __init__(self, options: argparse.Namespace):
+        self.options = options
+
+    def bind_tools(self, tools):
+        return self
+
+    async def ainvoke(self, messages):
+        session = _current_session.get()
+        if session is None or not session.llm_responses:
+            raise RuntimeError("Replay ran out of recorded LLM responses")
+        recorded = session.llm_responses.popleft()
+        await _simulate_latency(recorded["elapsed"], self.options)
+        return messages_from_dict([recorded["message"]])[0]
+
+    async def astream(self, messages):
+        message = await self.ainvoke(messages)
+        yield AIMessageChunk(
+            content=message.content,
+            tool_calls=message.tool_calls,
+            id=message.id,
+            usage_metadata=message.usage_metadata,
+        )
+
+
+async def _simulate_latency(elapsed: float, options: argparse.Namespace) -> None:
+    """Sleep for the recorded latency scaled by the speed-up factor."""
+    if not options.no_latency:
+        await asyncio.sleep(elapsed / options.speedup)
+
+
+def install_replay_backends(options: argparse.Namespace) -> None:
+    """Point the agent's LLM factory and Express client at the recording."""
+
+    def replay_get_llm(judge: int):
+        return ReplayLLM(options)
+
+    async def replay_request(method, endpoint, params=None, data=None):
+        session = _current_session.get()
+        queue = session.express_responses.get((method, endpoint)) if session else None
+        if not queue:
+            raise RuntimeError(f"No recorded Express response for {method} {endpoint}")
+        recorded = queue.popleft()
+        await _simulate_latency(recorded["elapsed"], options)
+        if recorded["error"] is not None:
+            raise RuntimeError(recorded["error"])
+        return recorded["result"]
+
+    agent_module.get_llm = replay_get_llm
+    express_client._request = replay_request
+
+
+def load_sessions(path: str) -> list[ReplaySession]:
+    """Group captured events by capture_id, keeping only complete requests."""
+    sessions: dict[str, ReplaySession] = {}
+    with open(path, "r", encoding="utf-8") as file:
+        for line in file:
+            if not line.strip():
+                continue
+            event = json.loads(line)
+            capture_id = event["capture_id"]
+            if capture_id not in sessions:
+                sessions[capture_id] = ReplaySession(capture_id)
+            sessions[capture_id].add_event(event)
+
+    complete = [s for s in sessions.values() if s.request is not None]
+    return sorted(complete, key=lambda s: s.started_at)
+
+
+async def replay_session(
+    client: httpx.AsyncClient,
+    session: ReplaySession,
+    delay: float,
+) -> dict[str, Any]:
+    """Send one recorded ChatRequest after `delay` seconds and time it."""
+    await asyncio.sleep(delay)
+    _current_session.set(session)
+
+    started = time.perf_counter()
+    response = await client.post("/chat", json=session.request)
+    elapsed = time.perf_counter() - started
+
+    body = response.json()
+    replayed = body.get("response") if response.status_code == 200 else None
+    if replayed is not None and session.redacted:
+        # The recorded response was masked, so compare masked text
+        replayed = mask_text(replayed)
+    return {
+        "capture_id": session.capture_id,
+        "status": response.status_code,
+        "elapsed": elapsed,
+        "matches": replayed == session.recorded_response,
+        "detail": None if response.status_code == 200 else body.get("detail"),
+    }
+
+
+async def run(options: argparse.Namespace) -> None:
+    """Replay every session and print per-request results plus a summary."""
+    sessions = load_sessions(options.capture_file)
+    if options.limit:
+        sessions = sessions[:options.limit]
+    if not sessions:
+        print("No complete captures found.")
+        return
+
+    install_replay_backends(options)
+    first_ts = sessions[0].started_at
+
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://replay", timeout=None) as client:
+        results = await asyncio.gather(*[
+            replay_session(client, session, (session.started_at - first_ts) / options.speedup)
+            for session in sessions
+        ])
+
+    for result in results:
+        marker = "same" if result["matches"] else "DIFF"
+        print(f"{result['capture_id']}  {result['status']}  {result['elapsed']:.3f}s  {marker}"
+              + (f"  {result['detail']}" if result["detail"] else ""))
+
+    latencies = sorted(r["elapsed"] for r in results)
+    p95_index = max(0, int(round(0.95 * len(latencies))) - 1)
+    print()
+    print(f"requests:  {len(results)}")
+    print(f"errors:    {sum(1 for r in results if r['status'] != 200)}")
+    print(f"diffs:     {sum(1 for r in results if not r['matches'])}")
+    print(f"p50:       {statistics.median(latencies):.3f}s")
+    print(f"p95:       {latencies[p95_index]:.3f}s")
+    print(f"max:       {latencies[-1]:.3f}s")
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Replay captured /chat traffic against main.app")
+    parser.add_argument("capture_file", help="JSONL file written via TRAFFIC_CAPTURE_FILE")
+    parser.add_argument("--speedup", type=float, default=1.0,
+                        help="Divide arrival gaps and recorded latencies by this factor")
+    parser.add_argument("--no-latency", action="store_true",
+                        help="Answer LLM/Express calls instantly instead of simulating recorded latency")
+    parser.add_argument("--limit", type=int, default=0,
+                        help="Replay only the first N captured requests")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    asyncio.run(run(parse_args()))